@@ -1,18 +1,29 @@
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
 import json
-from bs4 import BeautifulSoup
-import PyPDF2
-from io import BytesIO
 
 from datetime import datetime
 
+from agents.registry import AgentRegistry, default_registry
+from agents.text_cache import PageTextCache, default_cache
+
 class ClassifierAgent:
-    def __init__(self):
+    # Bump when format or intent rules change; stored results are reprocessed
+    RULES_VERSION = 1
+
+    def __init__(self, text_cache: Optional[PageTextCache] = None, registry: Optional[AgentRegistry] = None):
+        # PDFs already in the text cache are classified without parsing them
+        self.text_cache = text_cache if text_cache is not None else default_cache()
+        self.registry = registry or default_registry()
         self.format_detectors = {
             'json': self._is_json,
             'email': self._is_email,
             'pdf': self._is_pdf
         }
+        # Registered agents may bring detectors for formats not known here
+        for spec in self.registry.specs():
+            if spec.detect is not None:
+                for fmt in spec.formats:
+                    self.format_detectors.setdefault(fmt, spec.detect)
         
         # Enhanced intent detection with few-shot examples and weighted keywords
         self.intent_patterns = {
@@ -97,11 +108,24 @@ class ClassifierAgent:
             return False
 
     def _is_pdf(self, content: bytes) -> bool:
-        try:
-            PyPDF2.PdfReader(BytesIO(content))
-            return True
-        except:
-            return False
+        # Magic bytes only; parsing is left to the PDF agent's pool
+        return self.sniff_format(content) == 'pdf'
+
+    def sniff_format(self, content: bytes) -> str:
+        """Cheap format guess from the first bytes, without parsing the document"""
+        head = content[:1024]
+        if b'%PDF-' in head:
+            return 'pdf'
+        if head.lstrip()[:1] in (b'{', b'['):
+            return 'json'
+        text = head.decode('utf-8', errors='ignore')
+        if 'From:' in text or 'Subject:' in text:
+            return 'email'
+        return 'unknown'
+
+    def sniff_intent(self, head: bytes) -> str:
+        """Cheap intent guess from the first 4 KB, without parsing the document"""
+        return self._detect_intent(head[:4096].decode('utf-8', errors='ignore'))["intent"]
 
     def _detect_format(self, content: bytes) -> str:
         for fmt, detector in self.format_detectors.items():
@@ -179,16 +203,23 @@ class ClassifierAgent:
             'matches': best_intent[1]['matches']
         }
 
-    def classify(self, content: bytes) -> Dict[str, Any]:
+    def classify(self, content: bytes, digest: Optional[str] = None) -> Dict[str, Any]:
         """Enhanced classification with confidence scores and pattern matching.
         Returns a dict containing format and intent information.
+
+        digest is the SHA-256 of content, if the caller has already computed
+        it; it is recorded in the metadata so agents can reuse it.
         """
-        # Detect format with retry
-        try:
-            doc_format = self._detect_format(content)
-        except ValueError:
-            # If format detection fails, default to unknown
-            doc_format = 'unknown'
+        cached_pdf = self._cached_pdf(content, digest)
+        if cached_pdf is not None:
+            doc_format = 'pdf'
+        else:
+            # Detect format with retry
+            try:
+                doc_format = self._detect_format(content)
+            except ValueError:
+                # If format detection fails, default to unknown
+                doc_format = 'unknown'
         
         # Enhanced intent detection
         intent_result = self._detect_intent(content)
@@ -197,8 +228,10 @@ class ClassifierAgent:
         metadata = {
             'size': len(content),
             'timestamp': datetime.now().isoformat(),
-            'format_details': self._get_format_details(content, doc_format)
+            'format_details': self._get_format_details(content, doc_format, cached_pdf)
         }
+        if digest is not None:
+            metadata['sha256'] = digest
         
         return {
             'format': doc_format,
@@ -208,7 +241,14 @@ class ClassifierAgent:
             'metadata': metadata
         }
 
-    def _get_format_details(self, content: bytes, doc_format: str) -> Dict[str, Any]:
+    def _cached_pdf(self, content: bytes, digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Text cache entry for content that sniffs as a PDF, if one exists"""
+        if self.text_cache is None or self.sniff_format(content) != 'pdf':
+            return None
+        return self.text_cache.get(digest or self.text_cache.key(content))
+
+    def _get_format_details(self, content: bytes, doc_format: str,
+                            cached_pdf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Get additional format-specific details about the content"""
         details = {}
         
@@ -237,22 +277,16 @@ class ClassifierAgent:
             except:
                 details['parse_error'] = True
         
-        elif doc_format == 'pdf':
-            try:
-                pdf = PyPDF2.PdfReader(BytesIO(content))
-                details['pages'] = len(pdf.pages)
-                if pdf.metadata:
-                    details['metadata'] = dict(pdf.metadata)
-            except:
-                details['parse_error'] = True
+        elif doc_format == 'pdf' and cached_pdf is not None:
+            # Uncached PDFs are not parsed here; the pipeline takes their
+            # page count from the PDF agent's result
+            details['pages'] = cached_pdf['page_count']
+            if cached_pdf.get('metadata'):
+                details['metadata'] = cached_pdf['metadata']
         
         return details
 
     def get_target_agent(self, classification: Dict[str, str]) -> str:
-        """Determine which agent should handle this document"""
-        format_to_agent = {
-            'json': 'json_agent',
-            'email': 'email_agent',
-            'pdf': 'pdf_agent'
-        }
-        return format_to_agent.get(classification['format'], 'unknown_agent')
+        """Determine which registered agent should handle this document"""
+        spec = self.registry.for_format(classification['format'])
+        return spec.name if spec is not None else 'unknown_agent'
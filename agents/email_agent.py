@@ -1,12 +1,30 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
+import os
 import re
-from bs4 import BeautifulSoup
 from datetime import datetime
 from email import message_from_string
 from email.utils import parseaddr
 
+from agents.html_text import html_to_text
+
 class EmailAgent:
-    def __init__(self):
+    # Bump when extraction rules change; stored results are reprocessed
+    RULES_VERSION = 1
+
+    def __init__(self, max_attachment_bytes: Optional[int] = None, max_attachments: Optional[int] = None):
+        """
+        Args:
+            max_attachment_bytes: Larger attachments are listed but not decoded;
+                defaults to MAS_EMAIL_ATTACHMENT_MAX_BYTES or 25 MB
+            max_attachments: Attachments after this many are listed but not
+                decoded; defaults to MAS_EMAIL_MAX_ATTACHMENTS or 20
+        """
+        if max_attachment_bytes is None:
+            max_attachment_bytes = int(os.environ.get("MAS_EMAIL_ATTACHMENT_MAX_BYTES", 25 * 1024 * 1024))
+        if max_attachments is None:
+            max_attachments = int(os.environ.get("MAS_EMAIL_MAX_ATTACHMENTS", "20"))
+        self.max_attachment_bytes = max_attachment_bytes
+        self.max_attachments = max_attachments
         self.urgency_keywords = {
             'high': ['urgent', 'asap', 'emergency', 'critical', 'immediate'],
             'medium': ['important', 'priority', 'attention', 'needed'],
@@ -59,6 +77,10 @@ class EmailAgent:
                     "key_points": self._extract_key_points(body),
                     "action_items": self._extract_action_items(body)
                 },
+                "attachments": [
+                    {key: value for key, value in attachment.items() if key != "content"}
+                    for attachment in self._iter_attachment_parts(email_msg, decode=False)
+                ],
                 "processed_at": datetime.now().isoformat()
             }
             
@@ -78,23 +100,103 @@ class EmailAgent:
             name = email.split('@')[0]
         return name, email
 
+    def iter_attachments(self, content) -> Iterator[Dict[str, Any]]:
+        """
+        Yield an email's attachments one at a time, decoded as they are reached
+
+        Forwarded emails (message/rfc822 parts) are attachments too. Each
+        item has index, filename, content_type and size; content (bytes)
+        is included unless the attachment is over the size or count limit,
+        in which case "skipped" says why.
+        """
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        return self._iter_attachment_parts(message_from_string(content), decode=True)
+
+    def _iter_attachment_parts(self, email_msg, decode: bool) -> Iterator[Dict[str, Any]]:
+        for index, part in enumerate(self._attachment_parts(email_msg)):
+            attachment = {
+                "index": index,
+                "filename": part.get_filename(),
+                "content_type": part.get_content_type(),
+                "size": self._payload_size(part)
+            }
+            if index >= self.max_attachments:
+                attachment["skipped"] = f"more than {self.max_attachments} attachments"
+            elif attachment["size"] > self.max_attachment_bytes:
+                attachment["skipped"] = f"larger than {self.max_attachment_bytes} bytes"
+            elif decode:
+                if part.get_content_type() == "message/rfc822":
+                    data = part.get_payload(0).as_bytes()
+                else:
+                    data = part.get_payload(decode=True) or b""
+                attachment["content"] = data
+                attachment["size"] = len(data)
+            yield attachment
+
+    def _attachment_parts(self, email_msg) -> Iterator[Any]:
+        """Attachment parts in order, without descending into forwarded emails"""
+        if not email_msg.is_multipart():
+            return
+        for part in email_msg.get_payload():
+            if self._is_attachment(part):
+                yield part
+            elif part.is_multipart():
+                yield from self._attachment_parts(part)
+
+    @staticmethod
+    def _is_attachment(part) -> bool:
+        if part.get_content_type() == "message/rfc822":
+            return True
+        if part.is_multipart():
+            return False
+        return part.get_content_disposition() == "attachment" or (
+            part.get_filename() is not None and part.get_content_maintype() != "text"
+        )
+
+    @staticmethod
+    def _payload_size(part) -> int:
+        """Decoded size of a part, estimated from its encoded payload without decoding it"""
+        if part.get_content_type() == "message/rfc822":
+            return len(str(part.get_payload(0)))
+        payload = part.get_payload()
+        if not isinstance(payload, str):
+            return 0
+        if part.get('Content-Transfer-Encoding', '').lower() == 'base64':
+            return len(payload) * 3 // 4
+        return len(payload)
+
+    def _body_parts(self, email_msg) -> Iterator[Any]:
+        """Leaf parts in order, skipping attachments and forwarded emails"""
+        for part in email_msg.get_payload():
+            if self._is_attachment(part):
+                continue
+            if part.is_multipart():
+                yield from self._body_parts(part)
+            else:
+                yield part
+
     def _get_email_body(self, email_msg) -> str:
         """Extract email body, handling both plain text and HTML"""
         body = ""
         if email_msg.is_multipart():
-            for part in email_msg.walk():
+            for part in self._body_parts(email_msg):
                 if part.get_content_type() == "text/plain":
                     body = part.get_payload(decode=True).decode()
                     break
                 elif part.get_content_type() == "text/html":
                     html = part.get_payload(decode=True).decode()
-                    body = BeautifulSoup(html, 'html.parser').get_text()
+                    body = html_to_text(html)
                     break
         else:
             body = email_msg.get_payload(decode=True).decode()
             
         return body.strip()
 
+    def sniff_urgency(self, head: bytes) -> str:
+        """Cheap urgency guess from the first 4 KB of a raw email, without parsing it"""
+        return self._detect_urgency(head[:4096].decode('utf-8', errors='ignore'))
+
     def _detect_urgency(self, text: str) -> str:
         """Determine email urgency based on keywords"""
         text = text.lower()
@@ -0,0 +1,51 @@
+from typing import List
+from html.parser import HTMLParser
+
+# Elements whose content is code, not readable text
+SKIPPED_ELEMENTS = frozenset(['script', 'style', 'template'])
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text nodes from parser events without building a tree"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_ELEMENTS:
+            self.skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_ELEMENTS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.chunks.append(data)
+
+    def unknown_decl(self, data):
+        if data.startswith('CDATA[') and not self.skip_depth:
+            self.chunks.append(data[6:])
+
+
+def html_to_text(html: str) -> str:
+    """Text content of an HTML document, like BeautifulSoup's get_text().
+
+    Streams the markup through the stdlib parser, dropping script, style and
+    template content and decoding entities. Falls back to BeautifulSoup if
+    the stdlib parser rejects the input.
+    """
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        # BeautifulSoup is imported on first use to keep startup fast
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, 'html.parser').get_text()
+    return ''.join(extractor.chunks)
@@ -3,6 +3,9 @@ import json
 from datetime import datetime
 
 class JSONAgent:
+    # Bump when extraction rules change; stored results are reprocessed
+    RULES_VERSION = 1
+
     def __init__(self):
         self.required_fields = {
             'invoice': ['invoice_number', 'amount', 'due_date'],
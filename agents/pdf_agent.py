@@ -1,13 +1,49 @@
-from typing import Dict, Any, List
-import PyPDF2
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from io import BytesIO
 import re
+from bisect import bisect_right
 from datetime import datetime
 
 import json
 
+from agents.text_cache import PageTextCache, default_cache
+
+
+class _LineIndex:
+    """Offsets of every line start in a text, built in one pass"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = [0]
+        find = text.find
+        pos = find('\n')
+        while pos != -1:
+            self.starts.append(pos + 1)
+            pos = find('\n', pos + 1)
+
+    def bounds(self, pos: int) -> Tuple[int, int]:
+        """Return the (start, end) offsets of the line containing pos"""
+        line = bisect_right(self.starts, pos) - 1
+        end = self.starts[line + 1] - 1 if line + 1 < len(self.starts) else len(self.text)
+        return self.starts[line], end
+
+    def lines(self, text: Optional[str] = None):
+        """Yield each line, sliced from text (which must have the same offsets) if given"""
+        text = self.text if text is None else text
+        starts = self.starts
+        for i, start in enumerate(starts):
+            end = starts[i + 1] - 1 if i + 1 < len(starts) else len(text)
+            yield text[start:end]
+
+
 class PDFAgent:
-    def __init__(self):
+    # Bump when extraction rules change; stored results are reprocessed
+    RULES_VERSION = 2
+
+    def __init__(self, text_cache: Optional[PageTextCache] = None):
+        # Per-page text of previously seen PDFs, so re-runs skip PyPDF2
+        self.text_cache = text_cache if text_cache is not None else default_cache()
+
         self.compliance_keywords = {
             'gdpr': ['gdpr', 'data protection', 'privacy', 'personal data'],
             'fda': ['fda', 'food and drug', 'medical device', 'pharmaceutical'],
@@ -23,14 +59,47 @@ class PDFAgent:
             'subtotal',
             'tax'
         ]
+        self._field_patterns = [
+            (field, re.compile(re.escape(field) + r"[:\s]+([\d,.]+)"))
+            for field in self.invoice_fields
+        ]
+        self._line_item_pattern = re.compile(r'\d+\s+[\w\s]+\s+[\d,.]+\s+[\d,.]+')
+        
+        # Keyword -> categories, and for each keyword the (offset, keyword)
+        # pairs that can start inside it; the scan consumes a match, so these
+        # are checked explicitly to find overlaps like "personal data protection"
+        self._keyword_categories = {}
+        for category, keywords in self.compliance_keywords.items():
+            for keyword in keywords:
+                self._keyword_categories.setdefault(keyword.lower(), []).append(category)
+        self._keyword_overlaps = {
+            keyword: [
+                (offset, other)
+                for offset in range(len(keyword))
+                for other in self._keyword_categories
+                if (offset or other != keyword)
+                and (other.startswith(keyword[offset:]) or keyword[offset:].startswith(other))
+            ]
+            for keyword in self._keyword_categories
+        }
+        self._keyword_pattern = self._compile_keyword_pattern(list(self._keyword_categories))
+        self._header_pattern = re.compile(r'[A-Z\s]{5,}:?$')
+        self.context_chars = 100
 
-    def extract(self, content: bytes) -> Dict[str, Any]:
+    def extract(self, content: bytes, progress: Optional[Callable[[int, int], None]] = None,
+                digest: Optional[str] = None) -> Dict[str, Any]:
         """
         Extract and analyze content from PDF
+
+        Args:
+            content: Raw PDF bytes
+            progress: Optional callback invoked as progress(page, pages)
+                after each page's text has been extracted
+            digest: SHA-256 of content, if already computed
         """
         try:
-            # Parse PDF using PyPDF2
-            full_text = self._extract_text_pypdf2(content)
+            pages = self._cached_pages(content, progress, digest)
+            full_text = "".join(page + "\n" for page in pages)
             
             # Detect document type
             is_invoice = self._is_invoice(full_text)
@@ -42,7 +111,7 @@ class PDFAgent:
             
             # Add basic metadata
             result['metadata'] = {
-                'pages': len(PyPDF2.PdfReader(BytesIO(content)).pages),
+                'pages': len(pages),
                 'size': len(content)
             }
             
@@ -59,13 +128,46 @@ class PDFAgent:
                 "processed_at": datetime.now().isoformat()
             }
 
-    def _extract_text_pypdf2(self, content: bytes) -> str:
-        """Extract text using PyPDF2"""
+    def _cached_pages(self, content: bytes,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      digest: Optional[str] = None) -> List[str]:
+        """Page texts from the text cache, extracting and caching them on a miss"""
+        cache = self.text_cache
+        if cache is not None:
+            digest = digest or cache.key(content)
+        entry = cache.get(digest) if cache is not None else None
+        if entry is not None and entry.get("pages") is not None:
+            pages = entry["pages"]
+            if progress is not None:
+                for page in range(len(pages)):
+                    progress(page + 1, len(pages))
+            return pages
+
+        # PyPDF2 is imported on first use to keep startup fast
+        import PyPDF2
+        # Parse PDF once using PyPDF2
         pdf = PyPDF2.PdfReader(BytesIO(content))
-        text = ""
+        pages = self._extract_pages(pdf, progress)
+        if cache is not None:
+            try:
+                metadata = dict(pdf.metadata) if pdf.metadata else None
+            except Exception:
+                metadata = None
+            cache.put(digest, pages, metadata)
+        return pages
+
+    def _extract_pages(self, pdf: "PyPDF2.PdfReader",
+                       progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """Extract the text of every page using PyPDF2"""
+        if progress is None:
+            return [page.extract_text() for page in pdf.pages]
+        
+        pages = []
+        total = len(pdf.pages)
         for page in pdf.pages:
-            text += page.extract_text() + "\n"
-        return text
+            pages.append(page.extract_text())
+            progress(len(pages), total)
+        return pages
 
     def _is_invoice(self, text: str) -> bool:
         """Determine if the document is an invoice"""
@@ -74,7 +176,14 @@ class PDFAgent:
         return any(indicator in text for indicator in invoice_indicators)
 
     def _process_invoice(self, text: str) -> Dict[str, Any]:
-        """Process invoice-specific content"""
+        """Process invoice-specific content with precompiled field and line item patterns.
+
+        Matches exactly what a pattern built per field over text.lower() and
+        a per-line search did: a field's last parseable value wins, a name
+        also matches inside a longer one ("date" in "due date"), and line
+        items are the stripped lines holding a quantity, description, unit
+        price and amount.
+        """
         result = {
             "type": "invoice",
             "extracted_fields": {},
@@ -82,23 +191,18 @@ class PDFAgent:
             "flags": []
         }
         
-        # Extract invoice fields
-        for field in self.invoice_fields:
-            pattern = f"{field}[:\s]+([\d,.]+)"
-            matches = re.finditer(pattern, text.lower())
-            for match in matches:
-                value = match.group(1).replace(',', '')
+        # Extract invoice fields from the text lowercased once
+        lowered = text.lower()
+        for field, pattern in self._field_patterns:
+            for value in pattern.findall(lowered):
                 try:
-                    value = float(value)
-                    result["extracted_fields"][field] = value
+                    result["extracted_fields"][field] = float(value.replace(',', ''))
                 except ValueError:
                     continue
         
         # Extract line items (simple pattern matching)
-        lines = text.split('\n')
-        for line in lines:
-            if re.search(r'\d+\s+[\w\s]+\s+[\d,.]+\s+[\d,.]+', line):
-                result["line_items"].append(line.strip())
+        search = self._line_item_pattern.search
+        result["line_items"] = [line.strip() for line in text.split('\n') if search(line)]
         
         # Check for high-value invoice
         total = result["extracted_fields"].get("total", 0)
@@ -111,9 +215,47 @@ class PDFAgent:
         
         return result
 
+    @staticmethod
+    def _compile_keyword_pattern(keywords: List[str]) -> re.Pattern:
+        """Build one alternation that finds all keywords in a single scan of lowercased text"""
+        return re.compile("|".join(
+            re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)
+        ))
+
+    def _index_keywords(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Map each compliance category to the (start, end) spans of its keywords in lowercased text"""
+        spans = {}
+        
+        def add(keyword, start):
+            for category in self._keyword_categories[keyword]:
+                spans.setdefault(category, []).append((start, start + len(keyword)))
+        
+        for match in self._keyword_pattern.finditer(text):
+            keyword = match.group(0)
+            start = match.start()
+            add(keyword, start)
+            for offset, other in self._keyword_overlaps[keyword]:
+                if text.startswith(other, start + offset):
+                    add(other, start + offset)
+        return spans
+
+    def _context_windows(self, spans: List[Tuple[int, int]], index: _LineIndex) -> List[str]:
+        """Slice merged, same-line context windows around keyword spans"""
+        windows = []
+        for start, end in sorted(spans):
+            line_start, line_end = index.bounds(start)
+            window_start = max(line_start, start - self.context_chars)
+            window_end = min(line_end, end + self.context_chars)
+            if windows and window_start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], window_end)
+            else:
+                windows.append([window_start, window_end])
+        return [index.text[start:end] for start, end in windows]
+
     def _process_policy(self, text: str) -> Dict[str, Any]:
         """Process policy document content"""
-        text = text.lower()
+        lowered = text.lower()
+        index = _LineIndex(lowered)
         result = {
             "type": "policy",
             "compliance_flags": [],
@@ -121,29 +263,24 @@ class PDFAgent:
         }
         
         # Check for compliance keywords
-        for category, keywords in self.compliance_keywords.items():
-            matches = []
-            for keyword in keywords:
-                if keyword in text:
-                    # Get surrounding context
-                    pattern = f".{{0,100}}{keyword}.{{0,100}}"
-                    for match in re.finditer(pattern, text):
-                        matches.append(match.group(0))
-            
-            if matches:
+        spans = self._index_keywords(lowered)
+        for category in self.compliance_keywords:
+            if category in spans:
                 result["compliance_flags"].append({
                     "category": category,
-                    "matches": matches,
+                    "matches": self._context_windows(spans[category], index),
                     "severity": "high" if category in ["gdpr", "hipaa"] else "medium"
                 })
         
         # Extract key sections (headers and their content)
-        lines = text.split('\n')
         current_section = None
         section_content = []
         
+        # Headers are matched case-sensitively, so read lines from the original
+        # text; lower() only changes offsets for a handful of Unicode letters
+        lines = index.lines(text) if len(text) == len(lowered) else text.split('\n')
         for line in lines:
-            if re.match(r'^[A-Z\s]{5,}:?$', line):  # Possible header
+            if self._header_pattern.match(line):  # Possible header
                 if current_section:
                     result["key_sections"].append({
                         "title": current_section,
@@ -154,4 +291,10 @@ class PDFAgent:
             elif current_section:
                 section_content.append(line.strip())
         
+        if current_section:
+            result["key_sections"].append({
+                "title": current_section,
+                "content": ' '.join(section_content)
+            })
+        
         return result
@@ -0,0 +1,188 @@
+"""Registry of extraction agents.
+
+Each agent is described by an AgentSpec: the document formats it handles,
+how expensive it is, and the kind and size of worker pool it should run in.
+Agents are named by import path so they can be constructed lazily, and in
+worker processes.
+
+Extra agents are registered from the modules listed, comma-separated, in
+MAS_AGENT_MODULES. Each module must define ``register_agents(registry)``:
+
+    def register_agents(registry):
+        registry.register(AgentSpec(
+            name="xml_agent",
+            factory="my_agents.xml:XMLAgent",
+            formats=("xml",),
+            call=extract_xml,
+            detect=looks_like_xml
+        ))
+"""
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import importlib
+import os
+import threading
+
+# Signature of AgentSpec.call: (agent, content, classification, progress) -> result
+AgentCall = Callable[[Any, bytes, Dict[str, Any], Optional[Callable[[int, int], None]]], Dict[str, Any]]
+
+COST_CLASSES = ("light", "heavy")
+POOL_TYPES = ("thread", "process")
+
+
+class AgentSpec:
+    """How to build, invoke and schedule one extraction agent"""
+
+    def __init__(
+        self,
+        name: str,
+        factory: str,
+        formats: Tuple[str, ...],
+        call: AgentCall,
+        cost: str = "light",
+        pool: str = "thread",
+        workers: int = 4,
+        detect: Optional[Callable[[bytes], bool]] = None
+    ):
+        """
+        Args:
+            name: Agent name reported by ClassifierAgent.get_target_agent
+            factory: "module:Class" import path of the agent
+            formats: Document formats the agent extracts
+            call: Module-level function that runs the agent on a document;
+                it must be picklable to run in a process pool
+            cost: "light" or "heavy", a hint for scheduling and capacity planning
+            pool: "thread" or "process"; CPU-bound agents belong in processes
+            workers: Pool size; MAS_POOL_<NAME>_WORKERS overrides it
+            detect: Optional format detector for formats the classifier
+                does not already know
+        """
+        if cost not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class: {cost}")
+        if pool not in POOL_TYPES:
+            raise ValueError(f"Unknown pool type: {pool}")
+        self.name = name
+        self.factory = factory
+        self.formats = tuple(formats)
+        self.call = call
+        self.cost = cost
+        self.pool = pool
+        self.workers = int(os.environ.get(f"MAS_POOL_{name.upper()}_WORKERS", workers))
+        self.detect = detect
+
+    def agent_class(self) -> type:
+        module_name, class_name = self.factory.split(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def create(self) -> Any:
+        return self.agent_class()()
+
+    @property
+    def rules_version(self) -> int:
+        """The agent's RULES_VERSION; results stored under an older one are stale"""
+        return getattr(self.agent_class(), "RULES_VERSION", 1)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "formats": list(self.formats),
+            "rules_version": self.rules_version,
+            "cost": self.cost,
+            "pool": self.pool,
+            "workers": self.workers
+        }
+
+
+# Agent instances of this process, by name
+_instances: Dict[str, Any] = {}
+_instances_lock = threading.Lock()
+
+
+def get_agent(spec: AgentSpec) -> Any:
+    """This process's instance of an agent, constructed on first use"""
+    agent = _instances.get(spec.name)
+    if agent is None:
+        with _instances_lock:
+            agent = _instances.get(spec.name)
+            if agent is None:
+                agent = _instances[spec.name] = spec.create()
+    return agent
+
+
+def run_agent(spec: AgentSpec, content: bytes, classification: Dict[str, Any],
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Run an agent on a document in the current thread"""
+    return spec.call(get_agent(spec), content, classification, progress)
+
+
+class AgentRegistry:
+    """Agents by name and by the formats they handle"""
+
+    def __init__(self):
+        self._specs: Dict[str, AgentSpec] = {}
+        self._by_format: Dict[str, AgentSpec] = {}
+
+    def register(self, spec: AgentSpec):
+        """Add an agent; it takes over any format already claimed by another"""
+        self._specs[spec.name] = spec
+        for fmt in spec.formats:
+            self._by_format[fmt] = spec
+
+    def for_format(self, fmt: str) -> Optional[AgentSpec]:
+        return self._by_format.get(fmt)
+
+    def get(self, name: str) -> AgentSpec:
+        return self._specs[name]
+
+    def agent(self, name: str) -> Any:
+        """This process's instance of the named agent"""
+        return get_agent(self._specs[name])
+
+    def specs(self) -> List[AgentSpec]:
+        return list(self._specs.values())
+
+    def load_modules(self, module_names: List[str]):
+        """Import modules and let each register its agents"""
+        for module_name in module_names:
+            importlib.import_module(module_name).register_agents(self)
+
+
+def _extract_json(agent, content, classification, progress=None):
+    return agent.extract(content, classification["intent"])
+
+
+def _extract_email(agent, content, classification, progress=None):
+    return agent.extract(content)
+
+
+def _extract_pdf(agent, content, classification, progress=None):
+    return agent.extract(content, progress, classification.get("metadata", {}).get("sha256"))
+
+
+def register_builtin_agents(registry: AgentRegistry):
+    registry.register(AgentSpec(
+        name="json_agent", factory="agents.json_agent:JSONAgent",
+        formats=("json",), call=_extract_json, cost="light", pool="thread", workers=4
+    ))
+    registry.register(AgentSpec(
+        name="email_agent", factory="agents.email_agent:EmailAgent",
+        formats=("email",), call=_extract_email, cost="light", pool="thread", workers=4
+    ))
+    registry.register(AgentSpec(
+        name="pdf_agent", factory="agents.pdf_agent:PDFAgent",
+        formats=("pdf",), call=_extract_pdf, cost="heavy", pool="process",
+        workers=max(1, (os.cpu_count() or 2) // 2)
+    ))
+
+
+_default_registry: Optional[AgentRegistry] = None
+
+
+def default_registry() -> AgentRegistry:
+    """Built-in agents plus those registered by the modules in MAS_AGENT_MODULES"""
+    global _default_registry
+    if _default_registry is None:
+        registry = AgentRegistry()
+        register_builtin_agents(registry)
+        modules = os.environ.get("MAS_AGENT_MODULES", "")
+        registry.load_modules([name.strip() for name in modules.split(",") if name.strip()])
+        _default_registry = registry
+    return _default_registry
@@ -0,0 +1,142 @@
+from typing import Dict, Any, List, Optional
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+# Bump when extraction changes in a way that invalidates cached text
+CACHE_VERSION = 1
+
+
+class PageTextCache:
+    """Disk cache of per-page PDF text, keyed by the SHA-256 of the document.
+
+    Each document is one zlib-compressed JSON entry under root/<aa>/<sha256>.z
+    holding its page texts (by page index), page count and PDF metadata.
+    Reads touch the entry's mtime; once the cache grows past max_bytes the
+    least recently used entries are deleted. Safe to share between processes:
+    writes are atomic and a missing or corrupt entry is treated as a miss.
+    """
+
+    def __init__(self, root: str = "text_cache", max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.z"
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a document, or None on a miss"""
+        path = self.path(digest)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()))
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            self.misses += 1
+            return None
+        if entry.get("version") != CACHE_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def get_page(self, digest: str, index: int) -> Optional[str]:
+        """Text of one page, or None if the document or page is not cached"""
+        entry = self.get(digest)
+        if entry is None or entry.get("pages") is None or index >= len(entry["pages"]):
+            return None
+        return entry["pages"][index]
+
+    def put(self, digest: str, pages: List[str], metadata: Optional[Dict[str, Any]] = None):
+        """Store a document's page texts and metadata, evicting old entries if over budget"""
+        data = zlib.compress(json.dumps({
+            "version": CACHE_VERSION,
+            "page_count": len(pages),
+            "pages": pages,
+            "metadata": metadata
+        }, default=str).encode('utf-8'), 6)
+
+        path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for path in self.root.glob("*/*.z"):
+            try:
+                yield path, path.stat()
+            except FileNotFoundError:
+                pass
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back under budget.
+
+        Rescans the directory, since other processes share it.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+        self._size = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
+
+
+_default_cache: Optional[PageTextCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> Optional[PageTextCache]:
+    """Process-wide cache configured from MAS_TEXT_CACHE_DIR and MAS_TEXT_CACHE_MAX_BYTES.
+
+    Returns None when MAS_TEXT_CACHE_DIR is set to an empty string.
+    """
+    global _default_cache
+    root = os.environ.get("MAS_TEXT_CACHE_DIR", "text_cache")
+    if not root:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = PageTextCache(
+                root, int(os.environ.get("MAS_TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+            )
+        return _default_cache
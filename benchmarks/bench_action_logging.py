@@ -0,0 +1,58 @@
+"""Benchmark the logging cost ActionRouter adds to each action.
+
+Times ActionRouter._simulate_api_call with a large email-body payload
+while logs go to a file, either through a plain synchronous StreamHandler
+(what logging.basicConfig installs) or through mcp.logs.configure_logging.
+The queue writer is drained outside the timed loop.
+
+    python benchmarks/bench_action_logging.py --calls 2000 --body-kb 64
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp.action_router import ActionRouter
+from mcp.logs import configure_logging, shutdown_logging
+
+
+def time_calls(router: ActionRouter, payload, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        router._simulate_api_call("crm", "escalate", payload)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--body-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    payload = {"sender": "a@example.com", "body": "Please call me back. " * (args.body_kb * 50)}
+    router = ActionRouter(live=False)
+    root = logging.getLogger()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for level in ("INFO", "DEBUG"):
+            with open(os.path.join(tmp, f"sync-{level}.log"), "w") as stream:
+                handler = logging.StreamHandler(stream)
+                root.addHandler(handler)
+                root.setLevel(level)
+                sync_us = time_calls(router, payload, args.calls)
+                root.removeHandler(handler)
+
+            with open(os.path.join(tmp, f"queued-{level}.log"), "w") as stream:
+                configure_logging(level, stream=stream)
+                queued_us = time_calls(router, payload, args.calls)
+                shutdown_logging()
+
+            print(f"{level:5}  synchronous handler: {sync_us:8.1f} us/call   queued: {queued_us:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark HTML email body extraction.
+
+Compares the streaming ``agents.html_text.html_to_text`` extractor with
+building a BeautifulSoup tree and calling ``get_text()``, on a large
+marketing-style HTML email. Reports throughput and peak traced memory.
+
+    python benchmarks/bench_html_text.py --blocks 2000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from agents.html_text import html_to_text
+
+
+def bs4_text(html: str) -> str:
+    """The BeautifulSoup path replaced by html_to_text"""
+    return BeautifulSoup(html, 'html.parser').get_text()
+
+
+def make_html(blocks: int) -> str:
+    """Build a table-heavy newsletter with inline styles and tracking scripts"""
+    out = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Weekly offers</title>",
+        "<style>td{padding:4px}.cta{color:#fff;background:#e33}</style></head><body>",
+        "<script>window.dataLayer=[];function track(e){dataLayer.push(e)}</script>",
+        "<table width='100%' cellpadding='0' cellspacing='0'>",
+    ]
+    for i in range(blocks):
+        out.append(
+            f"<tr><td style='font-family:Arial;font-size:14px'>"
+            f"<a href='https://example.com/p/{i}?utm_source=mail' class='cta'>"
+            f"<img src='https://cdn.example.com/{i}.png' alt='Product {i}' width='120'/></a>"
+            f"<p>Product {i} &mdash; now 20&percnt; off. <b>Limited time</b> &amp; while "
+            f"stocks last. Please reply if you need a quote.</p></td></tr>"
+        )
+    out.append("</table><p>&copy; Example Ltd. Unsubscribe any time.</p></body></html>")
+    return "".join(out)
+
+
+def measure(func, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    html = make_html(args.blocks)
+    assert html_to_text(html) == bs4_text(html), "extractors disagree"
+    size_mb = len(html.encode()) / (1024 * 1024)
+
+    print(f"{size_mb:.2f} MB of HTML")
+    results = {name: measure(func, html, args.repeat)
+               for name, func in (("BeautifulSoup", bs4_text), ("html_to_text", html_to_text))}
+    for name, (seconds, peak) in results.items():
+        print(f"{name:14} {seconds * 1000:8.1f} ms  {size_mb / seconds:6.1f} MB/s  "
+              f"peak {peak / (1024 * 1024):6.1f} MB")
+    speedup = results["BeautifulSoup"][0] / results["html_to_text"][0]
+    print(f"speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark the memory footprint and lookup time of stored conversations.
+
+Builds N conversations, each with a classification, an extraction and
+routed actions, in a fresh process per layout:
+
+- dicts: the nested dicts MemoryStore held before ConversationRecord, as
+  json.load produced them from memory_store.json
+- records: ConversationRecord, as MemoryStore holds them now
+
+and reports the RSS they add, the time to look up a conversation's intent
+(a hot field), to materialize a whole conversation as dicts (free for the
+dict layout, which was returned as stored), and to scan every
+conversation's format. The dict layout needs about 6.5 KB per
+conversation, so the default 200k conversations need about 1.3 GB of RAM
+and 1M need over 6 GB; measure records alone at that size. A layout whose
+process dies (e.g. killed for running out of memory) is reported as failed.
+
+    python benchmarks/bench_memory_records.py
+    python benchmarks/bench_memory_records.py --conversations 1000000 --layouts records
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from multiprocessing import get_context
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.records import ConversationRecord
+
+FORMATS = ["pdf", "email", "json"]
+INTENTS = ["invoice", "rfq", "complaint", "regulation", "fraud_risk"]
+SERVICES = [("crm", "escalate"), ("risk", "alert"), ("finance", "process_invoice"), ("compliance", "review")]
+
+
+def conversation_json(i: int) -> str:
+    """One conversation as memory_store.json stored it"""
+    fmt, intent = FORMATS[i % 3], INTENTS[i % 5]
+    service, action = SERVICES[i % 4]
+    day = f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}"
+    return json.dumps({
+        "metadata": {"filename": f"upload-{i}.{fmt}", "content_type": f"application/{fmt}",
+                     "description": None, "size": 1000 + i % 5000,
+                     "upload_time": f"{day}T10:00:00.{i % 1000000:06d}", "raw_blob": f"{i:064x}"},
+        "history": [
+            {"timestamp": f"{day}T10:00:01.{i % 1000000:06d}",
+             "agent_output": {"classification": {"format": fmt, "intent": intent, "confidence": 0.8,
+                                                 "matches": [intent]}, "rules_version": 1}},
+            {"timestamp": f"{day}T10:00:02.{i % 1000000:06d}",
+             "agent_output": {"extraction": {"success": True, "data": {"reference": f"REF-{i}", "amount": i * 1.5}},
+                              "agent": f"{fmt}_agent", "rules_version": 1}},
+            {"timestamp": f"{day}T10:00:03.{i % 1000000:06d}",
+             "agent_output": {"actions": {"success": True, "actions": [
+                 {"service": service, "action": action, "status": "success",
+                  "request_id": f"{service}_{action}_{i}"}]}, "rules_version": 1}}
+        ],
+        "created_at": f"{day}T10:00:00.{i % 1000000:06d}",
+        "last_updated": f"{day}T10:00:03.{i % 1000000:06d}",
+        "blobs": [f"{i:064x}"]
+    })
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(layout: str, conversations: int, lookups: int, results):
+    ids = [str(uuid.UUID(int=i)) for i in range(conversations)]
+    before = rss_bytes()
+    store = {}
+    start = time.perf_counter()
+    for i, conversation_id in enumerate(ids):
+        conv = json.loads(conversation_json(i))
+        store[conversation_id] = ConversationRecord.from_dict(conv) if layout == "records" else conv
+    build = time.perf_counter() - start
+    added = rss_bytes() - before
+
+    sample = random.Random(0).choices(ids, k=lookups)
+    start = time.perf_counter()
+    for conversation_id in sample:
+        conv = store[conversation_id]
+        if layout == "records":
+            conv.intent
+        else:
+            [entry for entry in conv["history"] if "classification" in entry["agent_output"]][-1]["agent_output"]["classification"]["intent"]
+    intent_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    for conversation_id in sample:
+        conv = store[conversation_id]
+        # The dict layout was handed out as stored
+        conv.to_dict() if layout == "records" else conv
+    materialize_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    if layout == "records":
+        formats = [conv.format for conv in store.values()]
+    else:
+        formats = [conv["history"][0]["agent_output"]["classification"]["format"] for conv in store.values()]
+    scan = time.perf_counter() - start
+    assert len(formats) == conversations
+
+    results.put((layout, added, build, intent_us, materialize_us, scan))
+
+
+def wait_for_result(process, results):
+    """The process's measurements, or None if it exited without reporting any"""
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                # The result may still be in flight from a process that just exited
+                try:
+                    return results.get(timeout=1)
+                except queue.Empty:
+                    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--layouts", default="dicts,records")
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    results = context.Queue()
+    print(f"{args.conversations} conversations, {args.lookups} random lookups")
+    failed = 0
+    for layout in args.layouts.split(","):
+        process = context.Process(target=measure, args=(layout, args.conversations, args.lookups, results))
+        process.start()
+        result = wait_for_result(process, results)
+        process.join()
+        if result is None or process.exitcode != 0:
+            print(f"{layout:8} failed: exit code {process.exitcode}"
+                  + (" (killed, probably out of memory)" if process.exitcode == -9 else ""))
+            failed += 1
+            continue
+        layout, added, build, intent_us, materialize_us, scan = result
+        print(f"{layout:8} RSS +{added / 2**20:7.0f} MB ({added / args.conversations:5.0f} B/conv)  "
+              f"build {build:5.1f}s  intent {intent_us:5.2f} us  "
+              f"materialize {materialize_us:6.1f} us  scan formats {scan:5.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Benchmark concurrent writes to the sharded MemoryStore.
+
+Each worker process creates conversations and appends agent output to
+them, as uvicorn workers would, against one shared ShardedMemoryStore.
+Reports write throughput and the workers' CPU time per write for each
+worker count, checks that no write was lost, and times the single-file
+MemoryStore with one writer for reference. CPU time per write stays flat
+as workers are added if a write does not depend on what the other workers
+appended; unlike throughput it can be compared on a machine with fewer
+cores than workers.
+
+    python benchmarks/bench_memory_shards.py --conversations 500 --workers 1,2,4,8
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from typing import Tuple
+from multiprocessing import get_context
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.sharded import ShardedMemoryStore
+from memory.store import MemoryStore
+
+UPDATES = 3
+
+
+def agent_output(i: int):
+    return {
+        "classification": {"format": "json", "intent": "invoice", "confidence": 0.9,
+                           "matches": [f"invoice {i}", "amount due:"]},
+        "extraction": {"success": True, "data": {"invoice_number": f"INV-{i}", "amount": i * 10.0}},
+    }
+
+
+def write(store, conversations: int):
+    for i in range(conversations):
+        conversation_id = str(uuid.uuid4())
+        store.add_conversation(conversation_id, {"filename": f"doc-{i}.json", "size": 100})
+        for _ in range(UPDATES):
+            store.update_conversation(conversation_id, agent_output(i))
+
+
+def sharded_worker(root: str, shards: int, conversations: int):
+    write(ShardedMemoryStore(root, shards=shards), conversations)
+
+
+def run_sharded(workers: int, shards: int, conversations: int) -> Tuple[float, float]:
+    """Wall-clock seconds and the workers' CPU seconds"""
+    with tempfile.TemporaryDirectory() as root:
+        context = get_context("spawn")
+        processes = [
+            context.Process(target=sharded_worker, args=(root, shards, conversations))
+            for _ in range(workers)
+        ]
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+
+        store = ShardedMemoryStore(root, shards=shards)
+        expected = workers * conversations
+        found = store.count()
+        histories = sum(len(conv["history"]) for _, conv in store.iter_conversations(resolve=False))
+        assert found == expected, f"lost conversations: {found} of {expected}"
+        assert histories == expected * UPDATES, f"lost updates: {histories} of {expected * UPDATES}"
+    return elapsed, cpu
+
+
+def run_single_file(conversations: int) -> float:
+    with tempfile.TemporaryDirectory() as root:
+        store = MemoryStore(os.path.join(root, "memory_store.json"))
+        start = time.perf_counter()
+        write(store, conversations)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=500, help="conversations per worker")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    writes_per_worker = args.conversations * (1 + UPDATES)
+    elapsed = run_single_file(args.conversations)
+    print(f"single-file store, 1 writer: {writes_per_worker / elapsed:8.0f} writes/s")
+    for workers in [int(n) for n in args.workers.split(",")]:
+        elapsed, cpu = run_sharded(workers, args.shards, args.conversations)
+        writes = workers * writes_per_worker
+        print(f"{args.shards} shards, {workers} writers:   {writes / elapsed:8.0f} writes/s"
+              f"  {cpu / writes * 1e6:6.0f} us CPU/write  ({elapsed:.2f}s, no writes lost)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark PDFAgent invoice field extraction on multi-page invoices.
+
+Compares ``PDFAgent._process_invoice``, which lowercases the text once and
+runs precompiled field and line item patterns, with the previous
+implementation, which rebuilt a pattern and relowercased the text for every
+field and looked up the line item pattern for every line. Both return the
+same fields and line items (tests/test_pdf_invoice.py checks this).
+
+    python benchmarks/bench_pdf_invoice.py --pages 50 --repeat 20
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.pdf_agent import PDFAgent
+
+
+def legacy_process_invoice(fields, text):
+    """The implementation replaced by the precompiled patterns"""
+    result = {"extracted_fields": {}, "line_items": []}
+    for field in fields:
+        pattern = f"{field}[:\\s]+([\\d,.]+)"
+        for match in re.finditer(pattern, text.lower()):
+            try:
+                result["extracted_fields"][field] = float(match.group(1).replace(',', ''))
+            except ValueError:
+                continue
+    for line in text.split('\n'):
+        if re.search(r'\d+\s+[\w\s]+\s+[\d,.]+\s+[\d,.]+', line):
+            result["line_items"].append(line.strip())
+    return result
+
+
+def make_invoice_text(pages: int, items_per_page: int = 40) -> str:
+    """Build the text of a multi-page invoice as PyPDF2 would return it"""
+    out = []
+    for page in range(pages):
+        out.append(f"INVOICE  Page {page + 1} of {pages}")
+        out.append("Invoice Number: 100245")
+        out.append("Date: 2025-05-30    Due Date: 2025-06-30")
+        out.append("Bill To: ACME Corporation, 123 Business Ave, Tech City")
+        for i in range(items_per_page):
+            qty = i % 9 + 1
+            out.append(f"{qty} Professional services line {page} {i} 1,250.00 {qty * 1250:,.2f}")
+        out.append("Notes: payment terms are net 30 days from the invoice date.")
+    out.append("Subtotal: 1,250,000.00")
+    out.append("Tax: 0.00")
+    out.append("Total: 1,250,000.00")
+    return "\n".join(out) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    agent = PDFAgent()
+    text = make_invoice_text(args.pages)
+
+    current = agent._process_invoice(text)
+    legacy = legacy_process_invoice(agent.invoice_fields, text)
+    assert current["extracted_fields"] == legacy["extracted_fields"]
+    assert current["line_items"] == legacy["line_items"]
+
+    t_legacy = min(timeit.repeat(lambda: legacy_process_invoice(agent.invoice_fields, text),
+                                 number=1, repeat=args.repeat))
+    t_current = min(timeit.repeat(lambda: agent._process_invoice(text),
+                                  number=1, repeat=args.repeat))
+
+    print(f"pages={args.pages} chars={len(text):,} "
+          f"line_items={len(current['line_items'])} (legacy {len(legacy['line_items'])})")
+    print(f"legacy   {t_legacy * 1000:8.2f} ms")
+    print(f"compiled {t_current * 1000:8.2f} ms  ({t_legacy / t_current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark PDFAgent compliance context extraction on large policy manuals.
+
+Compares the keyword-index implementation in ``PDFAgent._process_policy``
+with the previous per-keyword ``.{0,100}keyword.{0,100}`` scan.
+
+    python benchmarks/bench_pdf_policy.py --sections 2000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.pdf_agent import PDFAgent
+
+
+def legacy_compliance_matches(compliance_keywords, text):
+    """The per-keyword wildcard scan replaced by the keyword index"""
+    text = text.lower()
+    flags = {}
+    for category, keywords in compliance_keywords.items():
+        matches = []
+        for keyword in keywords:
+            if keyword in text:
+                pattern = f".{{0,100}}{keyword}.{{0,100}}"
+                for match in re.finditer(pattern, text):
+                    matches.append(match.group(0))
+        if matches:
+            flags[category] = matches
+    return flags
+
+
+def make_policy_text(sections: int) -> str:
+    """Build the text of a long policy manual as PyPDF2 would return it"""
+    out = ["DATA PROTECTION AND PRIVACY MANUAL", ""]
+    for i in range(sections):
+        out.append(f"SECTION {i + 1}: OPERATING PROCEDURES")
+        out.append(
+            "Staff must follow the documented procedures for handling records and "
+            "escalating incidents to the responsible officer without undue delay."
+        )
+        if i % 10 == 0:
+            out.append(
+                "Personal data protection obligations under GDPR apply to all "
+                "processing, including medical privacy and payment card records."
+            )
+        out.append("")
+    return "\n".join(out) + "\n"
+
+
+def best_of(repeat, func, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    agent = PDFAgent()
+    text = make_policy_text(args.sections)
+
+    current = agent._process_policy(text)
+    legacy = legacy_compliance_matches(agent.compliance_keywords, text)
+    assert {flag["category"] for flag in current["compliance_flags"]} == set(legacy)
+
+    t_legacy = best_of(args.repeat, legacy_compliance_matches, agent.compliance_keywords, text)
+    t_current = best_of(args.repeat, agent._process_policy, text)
+
+    print(f"sections={args.sections} chars={len(text):,} "
+          f"key_sections={len(current['key_sections'])}")
+    print(f"legacy compliance scan   {t_legacy * 1000:9.2f} ms")
+    print(f"indexed _process_policy  {t_current * 1000:9.2f} ms  ({t_legacy / t_current:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Benchmark API import time and time to the first /health response.
+
+Each sample runs in a fresh interpreter. The "eager" variant calls
+``pipeline.warm_up()`` right after import, which reproduces the previous
+behaviour of importing every parser and agent and loading the memory store
+at module import.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import mcp.api as api
+imported = time.perf_counter()
+if {eager}:
+    api.pipeline.warm_up()
+asyncio.run(api.health_check())
+ready = time.perf_counter()
+print(json.dumps({{"import": imported - start, "ready": ready - start}}))
+"""
+
+
+def sample(eager: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(eager=eager)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for label, eager in (("lazy", False), ("eager", True)):
+        samples = [sample(eager) for _ in range(args.runs)]
+        imported = statistics.median(s["import"] for s in samples)
+        ready = statistics.median(s["ready"] for s in samples)
+        print(f"{label:5}  import {imported * 1000:7.1f} ms   first /health {ready * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Load-test the upload API against local stand-ins for the downstream services.
+
+Starts the stub crm/risk/compliance/finance services and a uvicorn server
+running mcp.api with ActionRouter in live mode pointed at them, then posts
+a weighted mix of PDF, JSON and email documents to /upload at a fixed
+arrival rate. Reports latency percentiles, throughput, error rates, stub
+call counts and the RSS of the server and its worker processes over time.
+
+    python benchmarks/loadtest.py --rate 20 --duration 30 --mix pdf=1,json=3,email=2 \\
+        --latency 0.05 --error-rate risk=0.1 --report report.json
+
+Latency is measured from each request's scheduled send time, so a server
+that falls behind is charged for the queueing it causes. Use --url to
+target a server that is already running (its process tree's RSS is sampled
+if --pid is given); the stubs then listen on --stub-port for it to be pointed at.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(REPO_DIR)
+
+from bench_text_cache import make_pdf
+from stub_services import StubServices, add_stub_arguments, parse_per_service
+
+
+def load_documents(pdf_pages: int) -> Dict[str, tuple]:
+    """One (filename, content, content type) sample per document kind"""
+    with open(os.path.join(REPO_DIR, "data", "sample_invoice.json"), "rb") as f:
+        invoice = f.read()
+    with open(os.path.join(REPO_DIR, "data", "sample_email.txt"), "rb") as f:
+        email = f.read()
+    return {
+        "pdf": ("policy.pdf", make_pdf(pdf_pages), "application/pdf"),
+        "json": ("invoice.json", invoice, "application/json"),
+        "email": ("complaint.eml", email, "message/rfc822"),
+    }
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        kind, weight = part.split("=")
+        weights[kind.strip()] = float(weight)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident set size of a process in bytes, from /proc"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants, from /proc/<pid>/task/*/children"""
+    pids, pending = [], [pid]
+    while pending:
+        pid = pending.pop()
+        pids.append(pid)
+        try:
+            tasks = os.listdir(f"/proc/{pid}/task")
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(f"/proc/{pid}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+    return pids
+
+
+def read_tree_rss(pid: int) -> Optional[tuple]:
+    """(summed RSS in bytes, process count) of pid and its descendants, such as
+    agent pool workers; pages shared between them are counted once per process"""
+    sizes = [rss for rss in map(read_rss, process_tree(pid)) if rss is not None]
+    return (sum(sizes), len(sizes)) if sizes else None
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def start_server(port: int, stub_url: str, workdir: str, extra_env: List[str]) -> subprocess.Popen:
+    """Run mcp.api under uvicorn in a scratch directory, with live actions against the stubs"""
+    # The app serves templates/ and static/ relative to its working directory
+    for name in ("templates", "static"):
+        os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_DIR,
+        MAS_ACTION_MODE="http",
+        MAS_ACTION_BASE_URL=stub_url,
+        MAS_BLOB_DIR=os.path.join(workdir, "blob_store"),
+        # Repeated documents would otherwise be served from the text cache
+        MAS_TEXT_CACHE_DIR="",
+    )
+    for item in extra_env:
+        key, value = item.split("=", 1)
+        env[key] = value
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mcp.api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not become healthy within 30 seconds")
+
+
+class LoadRun:
+    """Open-loop request generator and result collector"""
+
+    def __init__(self, url: str, documents: Dict[str, tuple], mix: Dict[str, float],
+                 rate: float, duration: float, concurrency: int, seed: Optional[int] = None):
+        self.url = url
+        self.documents = documents
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.rate = rate
+        self.duration = duration
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.results: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _send(self, kind: str, scheduled: float):
+        filename, content, content_type = self.documents[kind]
+        status, error, actions_failed = None, None, 0
+        try:
+            response = self._session().post(
+                f"{self.url}/upload",
+                files={"file": (filename, content, content_type)},
+                timeout=120
+            )
+            status = response.status_code
+            if response.ok:
+                actions = (response.json().get("actions") or {}).get("actions", [])
+                actions_failed = sum(1 for action in actions if action.get("status") != "success")
+        except requests.RequestException as e:
+            error = type(e).__name__
+        finished = time.monotonic()
+        with self._lock:
+            self.results.append({
+                "kind": kind,
+                "scheduled": scheduled,
+                "finished": finished,
+                "latency": finished - scheduled,
+                "status": status,
+                "error": error,
+                "actions_failed": actions_failed
+            })
+
+    def run(self) -> float:
+        """Send requests at the target rate for the duration; returns elapsed seconds"""
+        start = time.monotonic()
+        interval = 1.0 / self.rate
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            sent = 0
+            while True:
+                scheduled = start + sent * interval
+                if scheduled - start >= self.duration:
+                    break
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                kind = self.random.choices(self.kinds, self.weights)[0]
+                pool.submit(self._send, kind, scheduled)
+                sent += 1
+        return time.monotonic() - start
+
+
+class RssSampler(threading.Thread):
+    """Samples the RSS of a process and its descendants at a fixed interval"""
+
+    def __init__(self, pid: int, interval: float):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[tuple] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        start = time.monotonic()
+        while not self._stop_event.is_set():
+            sample = read_tree_rss(self.pid)
+            if sample is not None:
+                self.samples.append((round(time.monotonic() - start, 2), *sample))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def statuses(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Count of responses per HTTP status, or per exception name for failed requests"""
+    counts: Dict[str, int] = {}
+    for row in rows:
+        key = str(row["status"] or row["error"])
+        counts[key] = counts.get(key, 0) + 1
+    return dict(sorted(counts.items()))
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    def block(rows):
+        latencies = sorted(row["latency"] for row in rows)
+        failed = [row for row in rows if row["error"] or not (200 <= (row["status"] or 0) < 300)]
+        return {
+            "requests": len(rows),
+            "throughput_per_second": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(len(failed) / len(rows), 4) if rows else 0.0,
+            "statuses": statuses(rows),
+            "failed_actions": sum(row["actions_failed"] for row in rows),
+            "latency_seconds": {
+                "p50": round(percentile(latencies, 0.50), 4),
+                "p95": round(percentile(latencies, 0.95), 4),
+                "p99": round(percentile(latencies, 0.99), 4),
+                "max": round(latencies[-1], 4) if latencies else 0.0
+            }
+        }
+
+    kinds = sorted({row["kind"] for row in results})
+    return {
+        "overall": block(results),
+        "by_kind": {kind: block([row for row in results if row["kind"] == kind]) for kind in kinds}
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    config = report["config"]
+    print(f"\n{config['rate']} req/s for {config['duration']}s, mix {config['mix']}, "
+          f"elapsed {report['elapsed_seconds']}s")
+    print(f"{'kind':8} {'requests':>8} {'req/s':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = dict(report["by_kind"], all=report["overall"])
+    for kind, stats in rows.items():
+        latency = stats["latency_seconds"]
+        print(f"{kind:8} {stats['requests']:8} {stats['throughput_per_second']:7.1f} "
+              f"{stats['error_rate'] * 100:6.1f}% {latency['p50'] * 1000:8.1f} "
+              f"{latency['p95'] * 1000:8.1f} {latency['p99'] * 1000:8.1f}")
+    print(f"statuses: {report['overall']['statuses']}, failed actions: {report['overall']['failed_actions']}")
+    print("stub calls: " + ", ".join(
+        f"{service} {stats['calls']} ({stats['errors']} failed)" for service, stats in report["stubs"].items()
+    ))
+    if report["rss"]:
+        rss = [sample[1] for sample in report["rss"]]
+        processes = max(sample[2] for sample in report["rss"])
+        print(f"server RSS: start {rss[0] / 2**20:.1f} MB, peak {max(rss) / 2**20:.1f} MB, "
+              f"end {rss[-1] / 2**20:.1f} MB ({len(rss)} samples, up to {processes} processes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--mix", default="pdf=1,json=2,email=2", help="relative weights per document kind")
+    parser.add_argument("--concurrency", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="process whose tree to sample RSS from when using --url")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the started server (repeatable)")
+    parser.add_argument("--stub-port", type=int, default=0, help="stub port; 0 picks a free one")
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--report", help="also write the full report as JSON to this file")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    documents = load_documents(args.pdf_pages)
+    unknown = set(mix) - set(documents)
+    if unknown:
+        parser.error(f"unknown document kinds in --mix: {', '.join(sorted(unknown))}")
+
+    stubs = StubServices(
+        port=args.stub_port,
+        latency=parse_per_service(args.latency, 0.0),
+        error_rate=parse_per_service(args.error_rate, 0.0),
+        jitter=args.jitter,
+        seed=args.seed
+    ).start()
+    print(f"Stub services on {stubs.url}", file=sys.stderr)
+
+    server = None
+    workdir = tempfile.TemporaryDirectory(prefix="mas-loadtest-")
+    try:
+        if args.url:
+            url, pid = args.url.rstrip("/"), args.pid
+        else:
+            port = free_port()
+            server = start_server(port, stubs.url, workdir.name, args.server_env)
+            url, pid = f"http://127.0.0.1:{port}", server.pid
+        print(f"Driving {url}", file=sys.stderr)
+
+        sampler = RssSampler(pid, args.rss_interval) if pid else None
+        if sampler:
+            sampler.start()
+        run = LoadRun(url, documents, mix, args.rate, args.duration, args.concurrency, args.seed)
+        elapsed = run.run()
+        if sampler:
+            sampler.stop()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        stubs.stop()
+        workdir.cleanup()
+
+    report = {
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "pdf_pages": args.pdf_pages
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        **summarize(run.results, elapsed),
+        "stubs": stubs.stats(),
+        "rss": sampler.samples if sampler else []
+    }
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Local stand-ins for the crm, risk, compliance and finance services.
+
+Serves POST /crm, /risk, /compliance and /finance with configurable latency
+and error rates, so ActionRouter can run in live mode (MAS_ACTION_MODE=http)
+without the real services.
+
+    python benchmarks/stub_services.py --port 8001 --latency 0.05 --error-rate risk=0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+SERVICES = ("crm", "risk", "compliance", "finance")
+
+
+def parse_per_service(values: List[str], default: float) -> Dict[str, float]:
+    """Turn ["0.05", "risk=0.2"] into a value per service; bare numbers apply to all"""
+    result = {service: default for service in SERVICES}
+    for value in values or []:
+        if "=" in value:
+            service, number = value.split("=", 1)
+            if service not in result:
+                raise ValueError(f"Unknown service: {service}")
+            result[service] = float(number)
+        else:
+            result = {service: float(value) for service in SERVICES}
+    return result
+
+
+class StubServices:
+    """Threaded HTTP server answering every downstream service endpoint.
+
+    Each call sleeps for the service's latency (plus up to jitter times that,
+    uniformly) and fails with a 500 at the service's error rate.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8001,
+        latency: Optional[Dict[str, float]] = None,
+        error_rate: Optional[Dict[str, float]] = None,
+        jitter: float = 0.5,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency or {service: 0.0 for service in SERVICES}
+        self.error_rate = error_rate or {service: 0.0 for service in SERVICES}
+        self.jitter = jitter
+        self.calls = {service: 0 for service in SERVICES}
+        self.errors = {service: 0 for service in SERVICES}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                service = self.path.strip("/").split("/")[0]
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if service not in stubs.calls:
+                    self._reply(404, {"error": f"Unknown service: {service}"})
+                    return
+                delay, fail = stubs._draw(service)
+                time.sleep(delay)
+                if fail:
+                    self._reply(500, {"error": "Injected failure"})
+                else:
+                    self._reply(200, {"service": service, "status": "accepted"})
+
+            def _reply(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _draw(self, service: str):
+        """Count a call and pick its latency and whether it fails"""
+        with self._lock:
+            self.calls[service] += 1
+            base = self.latency[service]
+            delay = base * (1 + self._random.uniform(0, self.jitter))
+            fail = self._random.random() < self.error_rate[service]
+            if fail:
+                self.errors[service] += 1
+        return delay, fail
+
+    def start(self) -> "StubServices":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                service: {
+                    "calls": self.calls[service],
+                    "errors": self.errors[service],
+                    "latency_seconds": self.latency[service],
+                    "error_rate": self.error_rate[service]
+                }
+                for service in SERVICES
+            }
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", action="append", metavar="[SERVICE=]SECONDS",
+                        help="base latency of stub calls, for all services or one (repeatable)")
+    parser.add_argument("--error-rate", action="append", metavar="[SERVICE=]RATE",
+                        help="fraction of stub calls that fail with 500 (repeatable)")
+    parser.add_argument("--jitter", type=float, default=0.5,
+                        help="extra latency of up to this fraction of the base, uniformly")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = StubServices(
+        args.host, args.port,
+        latency=parse_per_service(args.latency, 0.0),
+        error_rate=parse_per_service(args.error_rate, 0.0),
+        jitter=args.jitter
+    )
+    print(f"Stub services listening on {stubs.url}")
+    try:
+        stubs.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(stubs.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
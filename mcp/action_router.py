@@ -1,22 +1,39 @@
-from typing import Dict, Any, List
-import requests
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 import json
 import logging
+import os
+
+from mcp.logs import LazyJSON
+
+logger = logging.getLogger(__name__)
 
 class ActionRouter:
-    def __init__(self):
+    # Bump when routing rules change; stored results are reprocessed
+    RULES_VERSION = 2
+
+    def __init__(self, live: Optional[bool] = None, base_url: Optional[str] = None, timeout: float = 5.0):
+        """
+        Args:
+            live: POST actions to the service endpoints instead of simulating
+                them; defaults to MAS_ACTION_MODE=http
+            base_url: Host serving the /crm, /risk, /compliance and /finance
+                endpoints; defaults to MAS_ACTION_BASE_URL or localhost:8001
+            timeout: Seconds to wait for a live service call
+        """
+        base_url = (base_url or os.environ.get('MAS_ACTION_BASE_URL', 'http://localhost:8001')).rstrip('/')
         self.endpoints = {
-            'crm': 'http://localhost:8001/crm',
-            'risk': 'http://localhost:8001/risk',
-            'compliance': 'http://localhost:8001/compliance',
-            'finance': 'http://localhost:8001/finance'
+            'crm': f'{base_url}/crm',
+            'risk': f'{base_url}/risk',
+            'compliance': f'{base_url}/compliance',
+            'finance': f'{base_url}/finance'
         }
-        
-        # Configure logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
+        self.live = live if live is not None else os.environ.get('MAS_ACTION_MODE', '').lower() == 'http'
+        self.timeout = timeout
+        self._session = None
+        # Handlers are installed by the process (mcp.logs.configure_logging), not per router
+        self.logger = logger
 
     def route_action(self, agent_output: Dict[str, Any], classification: Dict[str, str]) -> Dict[str, Any]:
         """
@@ -40,7 +57,7 @@ class ActionRouter:
             }
             
         except Exception as e:
-            self.logger.error(f"Action routing failed: {str(e)}")
+            self.logger.error("Action routing failed: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -54,9 +71,9 @@ class ActionRouter:
         if not agent_output.get('success', False):
             return actions
             
-        data = agent_output.get('data', {})
-        metadata = data.get('metadata', {})
-        content = data.get('content', {})
+        # EmailAgent returns its record at the top level
+        metadata = agent_output.get('metadata', {})
+        content = agent_output.get('content', {})
         
         # Check urgency and tone
         urgency = metadata.get('urgency', 'normal')
@@ -64,7 +81,7 @@ class ActionRouter:
         
         # Handle high urgency or negative tone
         if urgency == 'high' or tone in ['angry', 'threatening']:
-            action = self._simulate_api_call(
+            action = self._call_api(
                 'crm',
                 'escalate',
                 {
@@ -78,7 +95,7 @@ class ActionRouter:
         
         # Handle complaints
         if content.get('intent') == 'complaint':
-            action = self._simulate_api_call(
+            action = self._call_api(
                 'crm',
                 'create_ticket',
                 {
@@ -98,28 +115,30 @@ class ActionRouter:
         if not agent_output.get('success', False):
             return actions
             
-        data = agent_output.get('data', {})
+        # JSONAgent returns the formatted document under 'data' and its
+        # validation results next to it
+        content = agent_output.get('data', {}).get('content', {})
         
         # Handle anomalies
-        if data.get('anomalies'):
-            action = self._simulate_api_call(
+        if agent_output.get('anomalies'):
+            action = self._call_api(
                 'risk',
                 'report_anomaly',
                 {
-                    'anomalies': data['anomalies'],
-                    'source_data': data.get('content', {})
+                    'anomalies': agent_output['anomalies'],
+                    'source_data': content
                 }
             )
             actions.append(action)
         
         # Handle missing required fields
-        if data.get('missing_fields'):
-            action = self._simulate_api_call(
+        if agent_output.get('missing_fields'):
+            action = self._call_api(
                 'risk',
                 'validation_error',
                 {
-                    'missing_fields': data['missing_fields'],
-                    'source_data': data.get('content', {})
+                    'missing_fields': agent_output['missing_fields'],
+                    'source_data': content
                 }
             )
             actions.append(action)
@@ -139,7 +158,7 @@ class ActionRouter:
         if data.get('type') == 'invoice':
             total = data.get('extracted_fields', {}).get('total', 0)
             if total > 10000:
-                action = self._simulate_api_call(
+                action = self._call_api(
                     'finance',
                     'high_value_review',
                     {
@@ -153,7 +172,7 @@ class ActionRouter:
         if data.get('compliance_flags'):
             for flag in data['compliance_flags']:
                 if flag['severity'] == 'high':
-                    action = self._simulate_api_call(
+                    action = self._call_api(
                         'compliance',
                         'review_required',
                         {
@@ -165,6 +184,45 @@ class ActionRouter:
         
         return actions
 
+    def _call_api(self, service: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send an action to its service, or simulate it unless live mode is on"""
+        if self.live:
+            return self._post_api_call(service, action, payload)
+        return self._simulate_api_call(service, action, payload)
+
+    def _post_api_call(self, service: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST an action to the service endpoint; failures are reported in the action's status"""
+        endpoint = self.endpoints.get(service)
+        if not endpoint:
+            raise ValueError(f"Unknown service: {service}")
+        if self._session is None:
+            # requests is imported on first use to keep startup fast
+            import requests
+            self._session = requests.Session()
+        
+        response = {
+            "service": service,
+            "action": action,
+            "timestamp": datetime.now().isoformat(),
+            "request_id": f"{service}_{action}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "payload": payload
+        }
+        try:
+            reply = self._session.post(
+                endpoint,
+                data=json.dumps({"action": action, "payload": payload}, default=str),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout
+            )
+            response["http_status"] = reply.status_code
+            response["status"] = "success" if reply.ok else "failed"
+        except Exception as e:
+            self.logger.error("%s call to %s failed: %s", action, service, e,
+                              extra={"service": service, "action": action})
+            response["status"] = "failed"
+            response["error"] = str(e)
+        return response
+
     def _simulate_api_call(self, service: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Simulate an API call to external service
@@ -175,8 +233,11 @@ class ActionRouter:
             raise ValueError(f"Unknown service: {service}")
             
         # Log the action
-        self.logger.info(f"Simulating {action} call to {service}")
-        self.logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
+        self.logger.info("Simulating %s call to %s", action, service,
+                         extra={"service": service, "action": action})
+        # Rendered only if a debug record is sampled and written, on the log writer thread
+        self.logger.debug("Payload: %s", LazyJSON(payload, indent=2),
+                          extra={"service": service, "action": action})
         
         # Simulate API response
         response = {
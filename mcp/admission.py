@@ -0,0 +1,253 @@
+from typing import Dict, Any, Optional
+import asyncio
+import math
+import os
+import threading
+import time
+
+from mcp.scheduler import WeightedFairQueue
+
+
+class AdmissionRejected(Exception):
+    """Raised when a document cannot be admitted; maps to an HTTP response"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: Optional[int] = None):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """Concurrency slots and priority wait queue for one document format"""
+
+    def __init__(self, limit: int, queue_size: int, max_wait: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiters = WeightedFairQueue(max_wait=max_wait)
+        # Exponentially weighted mean processing time, seeds Retry-After
+        self.service_time = 1.0
+
+
+class Ticket:
+    """A document's claim on a lane slot and on the byte budget.
+
+    Tickets are either granted immediately by AdmissionController.admit() or
+    queued; await wait() (or call wait_blocking() from a worker thread) until
+    granted and always call release() afterwards. Tickets from
+    AdmissionController.charge() hold bytes but no slot.
+    """
+
+    def __init__(self, controller: "AdmissionController", fmt: str, size: int, priority: str,
+                 slot: bool = True):
+        self.controller = controller
+        self.format = fmt
+        self.size = size
+        self.priority = priority
+        self.slot = slot
+        self.granted = False
+        self.released = False
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self._future: Optional[asyncio.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[threading.Event] = None
+
+    async def wait(self, timeout: Optional[float] = None):
+        """Wait for a slot; raises AdmissionRejected (503) if none frees up in time"""
+        controller = self.controller
+        with controller._lock:
+            if self.granted:
+                return
+            self._loop = asyncio.get_running_loop()
+            self._future = self._loop.create_future()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._future),
+                controller.queue_timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            if controller._withdraw(self):
+                raise AdmissionRejected(
+                    503, f"Timed out waiting for a {self.format} processing slot",
+                    controller.retry_after(self.format)
+                )
+
+    def wait_blocking(self, timeout: Optional[float] = None):
+        """Like wait(), for threads outside the event loop"""
+        controller = self.controller
+        with controller._lock:
+            if self.granted:
+                return
+            self._event = threading.Event()
+        if not self._event.wait(controller.queue_timeout if timeout is None else timeout):
+            if controller._withdraw(self):
+                raise AdmissionRejected(
+                    503, f"Timed out waiting for a {self.format} processing slot",
+                    controller.retry_after(self.format)
+                )
+
+    def release(self):
+        """Return the slot and bytes to the controller; safe to call more than once"""
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """Per-format concurrency limits, bounded wait queues and an in-flight byte budget.
+
+    admit() never blocks: it grants a slot, queues the document, or raises
+    AdmissionRejected straight away (429 when the format's queue is full, 503
+    when the byte budget is exhausted, 413 for a document larger than the
+    whole budget). Queued documents are dequeued by priority lane with
+    weighted fair sharing; see mcp.scheduler. Methods are thread-safe so
+    tickets can be released from worker threads.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        queue_size: int = 32,
+        byte_budget: int = 256 * 1024 * 1024,
+        queue_timeout: float = 30.0,
+        default_limit: int = 4,
+        max_wait: float = 10.0
+    ):
+        self.lanes = {fmt: _Lane(limit, queue_size, max_wait) for fmt, limit in limits.items()}
+        self.default_lane = _Lane(default_limit, queue_size, max_wait)
+        self.byte_budget = byte_budget
+        self.queue_timeout = queue_timeout
+        self.bytes_in_flight = 0
+        self.rejected = {"413": 0, "429": 0, "503": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Build a controller from MAS_ADMIT_* environment variables"""
+        env = os.environ.get
+        return cls(
+            limits={
+                "pdf": int(env("MAS_ADMIT_PDF_CONCURRENCY", "2")),
+                "email": int(env("MAS_ADMIT_EMAIL_CONCURRENCY", "8")),
+                "json": int(env("MAS_ADMIT_JSON_CONCURRENCY", "8")),
+            },
+            queue_size=int(env("MAS_ADMIT_QUEUE_SIZE", "32")),
+            byte_budget=int(env("MAS_ADMIT_BYTE_BUDGET", str(256 * 1024 * 1024))),
+            queue_timeout=float(env("MAS_ADMIT_QUEUE_TIMEOUT", "30")),
+            default_limit=int(env("MAS_ADMIT_DEFAULT_CONCURRENCY", "4")),
+            max_wait=float(env("MAS_ADMIT_MAX_WAIT", "10")),
+        )
+
+    def _lane(self, fmt: str) -> _Lane:
+        return self.lanes.get(fmt, self.default_lane)
+
+    def admit(self, fmt: str, size: int, priority: str = "normal") -> Ticket:
+        """Grant or queue a document of the given format, size and priority, or reject it"""
+        ticket = Ticket(self, fmt, size, priority)
+        lane = self._lane(fmt)
+        with self._lock:
+            self._check_budget(size, lane)
+            if lane.active < lane.limit and not lane.waiters:
+                lane.active += 1
+                ticket.granted = True
+                ticket.started_at = time.monotonic()
+            elif len(lane.waiters) >= lane.queue_size:
+                self.rejected["429"] += 1
+                raise AdmissionRejected(429, f"Too many queued {fmt} documents", self._retry_after(lane))
+            else:
+                lane.waiters.push(ticket)
+            # Uploads are read into memory only once granted, but queued ones
+            # reserve their bytes now so that granting them never overshoots the budget
+            self.bytes_in_flight += size
+        return ticket
+
+    def charge(self, fmt: str, size: int) -> Ticket:
+        """Count a document against the byte budget without taking a slot, or reject it"""
+        ticket = Ticket(self, fmt, size, "normal", slot=False)
+        with self._lock:
+            self._check_budget(size, self._lane(fmt))
+            ticket.granted = True
+            self.bytes_in_flight += size
+        return ticket
+
+    def _check_budget(self, size: int, lane: _Lane):
+        """Raise AdmissionRejected if size does not fit the byte budget; called with the lock held"""
+        if size > self.byte_budget:
+            self.rejected["413"] += 1
+            raise AdmissionRejected(413, f"Document of {size} bytes exceeds the {self.byte_budget} byte budget")
+        if self.bytes_in_flight + size > self.byte_budget:
+            self.rejected["503"] += 1
+            raise AdmissionRejected(503, "In-flight byte budget exhausted", self._retry_after(lane))
+
+    def _withdraw(self, ticket: Ticket) -> bool:
+        """Remove a ticket that gave up waiting; False if it was granted meanwhile"""
+        with self._lock:
+            if ticket.granted:
+                return False
+            self._lane(ticket.format).waiters.remove(ticket)
+            self.bytes_in_flight -= ticket.size
+            ticket.released = True
+            return True
+
+    def _release(self, ticket: Ticket):
+        lane = self._lane(ticket.format)
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.bytes_in_flight -= ticket.size
+            if not ticket.slot:
+                return
+            if not ticket.granted:
+                lane.waiters.remove(ticket)
+                return
+            lane.active -= 1
+            elapsed = time.monotonic() - ticket.started_at
+            lane.service_time = 0.8 * lane.service_time + 0.2 * elapsed
+            self._grant_next(lane)
+
+    def _grant_next(self, lane: _Lane):
+        """Hand free slots to queued tickets; called with the lock held"""
+        while lane.waiters and lane.active < lane.limit:
+            ticket = lane.waiters.pop()
+            lane.active += 1
+            ticket.granted = True
+            ticket.started_at = time.monotonic()
+            if ticket._future is not None:
+                ticket._loop.call_soon_threadsafe(_resolve, ticket._future)
+            if ticket._event is not None:
+                ticket._event.set()
+
+    def _retry_after(self, lane: _Lane) -> int:
+        """Seconds until a slot is likely free, from queue depth and service time"""
+        return max(1, math.ceil(lane.service_time * (len(lane.waiters) + 1) / max(lane.limit, 1)))
+
+    def retry_after(self, fmt: str) -> int:
+        with self._lock:
+            return self._retry_after(self._lane(fmt))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current slot usage, queue depths and rejection counts"""
+        with self._lock:
+            lanes = dict(self.lanes, default=self.default_lane)
+            return {
+                "lanes": {
+                    fmt: {
+                        "limit": lane.limit,
+                        "active": lane.active,
+                        "queue_depth": len(lane.waiters),
+                        "queue_size": lane.queue_size,
+                        "mean_service_seconds": round(lane.service_time, 3),
+                        "priorities": lane.waiters.snapshot()
+                    }
+                    for fmt, lane in lanes.items()
+                },
+                "bytes_in_flight": self.bytes_in_flight,
+                "byte_budget": self.byte_budget,
+                "rejected": dict(self.rejected)
+            }
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
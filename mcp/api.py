@@ -1,10 +1,13 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from typing import Dict, Any, Optional
+from contextlib import asynccontextmanager
+import threading
 import uuid
 from pathlib import Path
 import sys
@@ -16,17 +19,56 @@ from datetime import datetime
 # Add parent directory to path to import agents
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from agents.classifier import ClassifierAgent
-from agents.json_agent import JSONAgent
-from agents.email_agent import EmailAgent
-from agents.pdf_agent import PDFAgent
+from agents.registry import default_registry
+from memory.blobs import BlobStore
+from memory.sharded import ShardedMemoryStore
 from memory.store import MemoryStore
-from mcp.action_router import ActionRouter
+from mcp.admission import AdmissionController, AdmissionRejected, Ticket
+from mcp.logs import configure_logging, logging_stats, shutdown_logging
+from mcp.pipeline import DocumentPipeline
+from mcp.pools import AgentPools
+from mcp.profiling import PROFILE_ARTIFACT, RequestProfiler, dump_stats, load_stats
+from mcp.progress import ProgressBroker
+from mcp.scheduler import assign_priority
+
+configure_logging()
+
+# Initialize components; agents and stored conversations load on first use
+blob_store = BlobStore(os.environ.get("MAS_BLOB_DIR", "blob_store"))
+# Run several uvicorn workers only with MAS_MEMORY_SHARDS set: the single-file store is per-process
+if int(os.environ.get("MAS_MEMORY_SHARDS", "0")) > 0:
+    memory = ShardedMemoryStore(
+        os.environ.get("MAS_MEMORY_DIR", "memory_shards"),
+        shards=int(os.environ["MAS_MEMORY_SHARDS"]),
+        blob_store=blob_store
+    )
+else:
+    memory = MemoryStore(blob_store=blob_store)
+# Each agent gets its own worker pool unless MAS_AGENT_POOLS=0
+pools = None
+if os.environ.get("MAS_AGENT_POOLS", "1").lower() not in ("0", "false", "no"):
+    pools = AgentPools(default_registry())
+admission = AdmissionController.from_env()
+# Email attachments go through admission too, after they are decoded
+pipeline = DocumentPipeline(memory, pools=pools, admission=admission)
+progress = ProgressBroker()
+profiler = RequestProfiler.from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optionally warm up in the background so /health answers immediately
+    if os.environ.get("MAS_WARMUP", "").lower() in ("1", "true", "yes"):
+        threading.Thread(target=pipeline.warm_up, name="warm-up", daemon=True).start()
+    yield
+    if pools is not None:
+        pools.shutdown()
+    shutdown_logging()
 
 app = FastAPI(
     title="Multi-Agent Document Processor",
     description="An intelligent system for processing various document formats",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS
@@ -42,13 +84,32 @@ app.add_middleware(
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize components
-classifier = ClassifierAgent()
-json_agent = JSONAgent()
-email_agent = EmailAgent()
-pdf_agent = PDFAgent()
-memory = MemoryStore()
-action_router = ActionRouter()
+def project_fields(document: Any, fields: Optional[str]) -> Any:
+    """Keep only the comma-separated dotted paths in fields, e.g. "classification.intent".
+
+    Paths descend into lists element-wise; unknown paths are ignored.
+    """
+    if not fields:
+        return document
+    paths = [path.strip().split(".") for path in fields.split(",") if path.strip()]
+    return _project(document, paths)
+
+def _project(value: Any, paths: list) -> Any:
+    if isinstance(value, list):
+        return [_project(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+    
+    subpaths = {}
+    for key, *rest in paths:
+        subpaths.setdefault(key, []).append(rest)
+    
+    projected = {}
+    for key, rest in subpaths.items():
+        if key in value:
+            # An exact path keeps the whole sub-document
+            projected[key] = value[key] if [] in rest else _project(value[key], rest)
+    return projected
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -72,68 +133,125 @@ async def home(request: Request):
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+async def admit_upload(file: UploadFile) -> Ticket:
+    """Admit an upload by its size and a pre-classification of its first bytes, before reading it into memory.
+
+    The multipart parser has already spooled the body to a temporary file;
+    only its first 4 KB are read here. Callers read the rest once the ticket
+    is granted.
+    """
+    head = await file.read(4096)
+    size = file.size
+    if size is None:
+        size = await run_in_threadpool(file.file.seek, 0, os.SEEK_END)
+    await file.seek(0)
+    pre_classification = await run_in_threadpool(pipeline.pre_classify, head)
+    return admission.admit(pre_classification["format"], size, assign_priority(pre_classification))
+
+def rejection_response(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={
+            "success": False,
+            "error": e.reason,
+            "processed_at": datetime.now().isoformat()
+        },
+        headers={"Retry-After": str(e.retry_after)} if e.retry_after else None
+    )
+
+class ClosingJSONResponse(JSONResponse):
+    """JSONResponse that calls on_close() once it has been sent and its background
+    tasks have run, or as soon as sending fails and they never will"""
+
+    def __init__(self, on_close, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+def profile_reason(request: Request, profile: Optional[str]) -> Optional[str]:
+    """Whether to profile this upload: ?profile=1 or X-Profile: 1 with X-Profile-Token, or sampling"""
+    flag = profile if profile is not None else request.headers.get("X-Profile", "")
+    requested = flag.lower() in ("1", "true", "yes")
+    return profiler.should_profile(requested, request.headers.get("X-Profile-Token"))
+
+def forbidden_response(e: PermissionError) -> JSONResponse:
+    return JSONResponse(
+        status_code=403,
+        content={
+            "success": False,
+            "error": str(e),
+            "processed_at": datetime.now().isoformat()
+        }
+    )
+
+def process_document(reason: Optional[str], content: bytes, **kwargs) -> Dict[str, Any]:
+    """Run the pipeline, under cProfile when reason is set, storing the profile with the conversation.
+
+    Profiled documents are extracted in the request thread rather than the
+    agent pools, since cProfile would only see the wait for the pool. Only
+    explicitly requested profiles are summarized in the result; sampled
+    ones are just stored.
+    """
+    if reason is None:
+        return pipeline.process(content, **kwargs)
+    processed, stats = profiler.run(pipeline.process, content, inline=True, **kwargs)
+    if stats is not None:
+        conversation_id = processed["conversation_id"]
+        memory.add_artifact(conversation_id, PROFILE_ARTIFACT, dump_stats(stats))
+        if reason == "requested":
+            processed["profile"] = {
+                **profiler.summarize(stats),
+                "pstats": f"/profile/{conversation_id}/pstats"
+            }
+    return processed
+
 @app.post("/upload")
 
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
-    description: str = Form(None)
+    description: str = Form(None),
+    fields: Optional[str] = None,
+    profile: Optional[str] = None
 ) -> JSONResponse:
     try:
-        # Generate conversation ID
-        conversation_id = str(uuid.uuid4())
+        reason = profile_reason(request, profile)
+    except PermissionError as e:
+        return forbidden_response(e)
+    
+    try:
+        ticket = await admit_upload(file)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    
+    try:
+        await ticket.wait()
         
         # Read file content
         content = await file.read()
         
-        # Store initial metadata
-        memory.add_conversation(conversation_id, {
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "description": description,
-            "size": len(content),
-            "upload_time": datetime.now().isoformat()
-        })
-        
-        # Classify document
-        classification = classifier.classify(content)
-        memory.update_conversation(conversation_id, {
-            "classification": classification
-        })
-        
-        # Route to appropriate agent
-        target_agent = classifier.get_target_agent(classification)
-        result = None
-        
-        # Process with appropriate agent
-        if target_agent == "json_agent":
-            result = json_agent.extract(content, classification["intent"])
-        elif target_agent == "email_agent":
-            result = email_agent.extract(content)
-        elif target_agent == "pdf_agent":
-            result = pdf_agent.extract(content)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported format: {classification['format']}")
-        
-        if result:
-            memory.update_conversation(conversation_id, {
-                "extraction": result
-            })
-            
-            # Route to follow-up actions
-            actions = action_router.route_action(result, classification)
-            memory.update_conversation(conversation_id, {
-                "actions": actions
-            })
+        processed = await run_in_threadpool(
+            process_document,
+            reason,
+            content,
+            filename=file.filename,
+            content_type=file.content_type,
+            description=description
+        )
         
         return JSONResponse({
             "success": True,
-            "conversation_id": conversation_id,
-            "classification": classification,
-            "result": result,
-            "actions": actions if result else None,
+            **project_fields(processed, fields),
             "processed_at": datetime.now().isoformat()
         })
         
+    except AdmissionRejected as e:
+        return rejection_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -143,35 +261,177 @@ async def upload_file(
                 "processed_at": datetime.now().isoformat()
             }
         )
+    finally:
+        ticket.release()
+
+@app.post("/upload/async", status_code=202)
+async def upload_file_async(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    description: str = Form(None),
+    profile: Optional[str] = None
+) -> JSONResponse:
+    """Accept a document and process it in the background.
+
+    Stage events and partial results are streamed from /events/{conversation_id}.
+    """
+    try:
+        reason = profile_reason(request, profile)
+    except PermissionError as e:
+        return forbidden_response(e)
+    
+    try:
+        ticket = await admit_upload(file)
+    except AdmissionRejected as e:
+        return rejection_response(e)
+    
+    conversation_id = str(uuid.uuid4())
+    started = False
+    
+    async def run():
+        nonlocal started
+        started = True
+        try:
+            await ticket.wait()
+            # The upload stays open until background tasks finish
+            content = await file.read()
+            processed = await run_in_threadpool(
+                process_document,
+                reason,
+                content,
+                filename=file.filename,
+                content_type=file.content_type,
+                description=description,
+                conversation_id=conversation_id,
+                on_event=lambda stage, data: progress.publish(conversation_id, stage, data)
+            )
+            progress.publish(conversation_id, "completed", {
+                "success": True,
+                **processed,
+                "processed_at": datetime.now().isoformat()
+            })
+        except Exception as e:
+            progress.publish(conversation_id, "failed", {
+                "success": False,
+                "error": str(e),
+                "processed_at": datetime.now().isoformat()
+            })
+        finally:
+            ticket.release()
+    
+    def abandon():
+        # FastAPI skips background tasks when the response cannot be sent
+        if not started:
+            ticket.release()
+            progress.publish(conversation_id, "failed", {
+                "success": False,
+                "error": "Upload abandoned before processing started",
+                "processed_at": datetime.now().isoformat()
+            })
+    
+    try:
+        progress.open(conversation_id)
+        progress.publish(conversation_id, "received", {
+            "filename": file.filename,
+            "size": ticket.size,
+            "priority": ticket.priority
+        })
+        background_tasks.add_task(run)
+        # The request owns the ticket until run() takes it over
+        return ClosingJSONResponse(
+            abandon,
+            status_code=202,
+            content={
+                "success": True,
+                "conversation_id": conversation_id,
+                "events": f"/events/{conversation_id}",
+                "status": f"/status/{conversation_id}"
+            }
+        )
+    except BaseException:
+        ticket.release()
+        raise
+
+@app.get("/events/{conversation_id}")
+async def stream_events(conversation_id: str):
+    """Server-sent events for a document submitted through /upload/async"""
+    if not progress.exists(conversation_id):
+        raise HTTPException(status_code=404, detail=f"No progress stream for conversation {conversation_id}")
+    
+    async def event_stream():
+        async for event in progress.subscribe(conversation_id):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['stage']}\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/status/{conversation_id}")
-async def get_status(conversation_id: str):
+async def get_status(conversation_id: str, fields: Optional[str] = None):
     conversation = memory.get_conversation(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found")
-    return conversation
+    return project_fields(conversation, fields)
+
+def stored_profile(request: Request, conversation_id: str) -> bytes:
+    if not profiler.authorized(request.headers.get("X-Profile-Token")):
+        raise HTTPException(status_code=403, detail="Profiles require a valid profile token")
+    data = memory.get_artifact(conversation_id, PROFILE_ARTIFACT)
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"No profile for conversation {conversation_id}")
+    return data
+
+@app.get("/profile/{conversation_id}")
+async def get_profile(request: Request, conversation_id: str):
+    """Hot-path breakdown of a profiled conversation"""
+    return {
+        "conversation_id": conversation_id,
+        **profiler.summarize(load_stats(stored_profile(request, conversation_id))),
+        "pstats": f"/profile/{conversation_id}/pstats"
+    }
+
+@app.get("/profile/{conversation_id}/pstats")
+async def download_profile(request: Request, conversation_id: str):
+    """Raw cProfile stats, for python -m pstats or snakeviz"""
+    return Response(
+        stored_profile(request, conversation_id),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{conversation_id}.pstats"'}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Admission gauges (per-format slots, queue depths and wait times by priority, bytes, rejections), agent pools and the log queue"""
+    return {
+        "admission": admission.snapshot(),
+        "agents": pools.snapshot() if pools is not None else None,
+        "logging": logging_stats(),
+        "generated_at": datetime.now().isoformat()
+    }
 
 @app.get("/stats")
 async def get_stats():
     """Get system statistics"""
-    total_processed = len(memory._store)
+    total_processed = 0
     formats = {}
     intents = {}
     actions = {}
     
-    for conv in memory._store.values():
-        if "classification" in conv:
-            fmt = conv["classification"].get("format")
-            intent = conv["classification"].get("intent")
-            if fmt:
-                formats[fmt] = formats.get(fmt, 0) + 1
-            if intent:
-                intents[intent] = intents.get(intent, 0) + 1
-        
-        if "actions" in conv:
-            for action in conv["actions"].get("actions", []):
-                action_type = f"{action['service']}_{action['action']}"
-                actions[action_type] = actions.get(action_type, 0) + 1
+    # Each conversation's latest classification and actions, without decoding its history
+    for _, fmt, intent, action_types in memory.iter_summaries():
+        total_processed += 1
+        if fmt:
+            formats[fmt] = formats.get(fmt, 0) + 1
+        if intent:
+            intents[intent] = intents.get(intent, 0) + 1
+        for action_type in action_types:
+            actions[action_type] = actions.get(action_type, 0) + 1
     
     return {
         "total_processed": total_processed,
@@ -0,0 +1,153 @@
+"""Offline batch processing without the API server.
+
+Runs the classifier -> agent -> action router pipeline over every file in a
+directory tree, or over a JSONL manifest with one ``{"path": ...}`` object
+per line, and streams one JSON result per document.
+
+    python -m mcp.batch data/ --workers 4 --output results.jsonl
+    python -m mcp.batch jobs.jsonl --workers 8 --chunksize 32
+"""
+from typing import Dict, Any, Iterator, Optional
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from pathlib import Path
+
+# Add parent directory to path to import agents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp.logs import configure_logging
+from mcp.pipeline import DocumentPipeline
+
+# One pipeline per worker process, built by _init_worker
+_pipeline: Optional[DocumentPipeline] = None
+
+
+def iter_jobs(source: str, pattern: str = "*") -> Iterator[Dict[str, Any]]:
+    """Yield jobs from a directory tree or a JSONL manifest"""
+    root = Path(source)
+    if root.is_dir():
+        for path in sorted(root.rglob(pattern)):
+            if path.is_file():
+                yield {"path": str(path)}
+        return
+
+    with open(root, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            path = entry.get("path") or entry.get("file")
+            if not path:
+                raise ValueError(f"{source}:{line_number}: manifest entry has no 'path'")
+            # Relative paths are resolved against the manifest's directory
+            entry["path"] = str(root.parent / path)
+            yield entry
+
+
+def _init_worker():
+    global _pipeline
+    configure_logging()
+    _pipeline = DocumentPipeline()
+
+
+def process_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a single job through the worker's pipeline"""
+    record = {"path": job["path"]}
+    if "id" in job:
+        record["id"] = job["id"]
+
+    try:
+        with open(job["path"], "rb") as f:
+            content = f.read()
+        processed = _pipeline.process(
+            content,
+            filename=os.path.basename(job["path"]),
+            description=job.get("description")
+        )
+        record.update({"success": True, **processed})
+    except Exception as e:
+        record.update({"success": False, "error": str(e)})
+
+    record["processed_at"] = datetime.now().isoformat()
+    return record
+
+
+class _Progress:
+    """Periodic progress line on stderr"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = 0.0
+        self.done = 0
+        self.failed = 0
+
+    def update(self, record: Dict[str, Any]):
+        self.done += 1
+        if not record["success"]:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        print(
+            f"processed {self.done} ({self.failed} failed) in {elapsed:.1f}s, {rate:.1f} docs/s",
+            file=sys.stderr
+        )
+
+
+def run(source: str, output, workers: int, chunksize: int, pattern: str = "*") -> _Progress:
+    """Process every job from source and write JSONL records to output"""
+    progress = _Progress()
+    jobs = iter_jobs(source, pattern)
+
+    def emit(record):
+        output.write(json.dumps(record, default=str) + "\n")
+        output.flush()
+        progress.update(record)
+
+    if workers <= 1:
+        _init_worker()
+        for job in jobs:
+            emit(process_job(job))
+    else:
+        with Pool(workers, initializer=_init_worker) as pool:
+            for record in pool.imap_unordered(process_job, jobs, chunksize=chunksize):
+                emit(record)
+
+    progress.report()
+    return progress
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Process documents offline and write JSONL results")
+    parser.add_argument("source", help="Directory to scan, or a JSONL manifest of {\"path\": ...} entries")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="Jobs handed to a worker at a time")
+    parser.add_argument("--pattern", default="*", help="Glob for files when scanning a directory")
+    args = parser.parse_args(argv)
+
+    if args.output == "-":
+        progress = run(args.source, sys.stdout, args.workers, args.chunksize, args.pattern)
+    else:
+        with open(args.output, "w") as output:
+            progress = run(args.source, output, args.workers, args.chunksize, args.pattern)
+
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
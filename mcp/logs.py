@@ -0,0 +1,173 @@
+"""Non-blocking structured logging.
+
+configure_logging() routes every record through a bounded in-memory queue to
+a background writer thread, so a log call on the request path costs an
+enqueue and never waits on stderr or a file. Records are formatted on that
+thread: message arguments (wrap payloads in LazyJSON) are only rendered
+for records that pass the level check and the sampler, and never on the
+caller's thread, so do not mutate an argument after logging it.
+
+    logger = logging.getLogger(__name__)
+    logger.info("Routed %s", action, extra={"service": service, "conversation_id": cid})
+    logger.debug("Payload: %s", LazyJSON(payload))
+
+Configured from the environment:
+    MAS_LOG_LEVEL         Root level (default INFO)
+    MAS_LOG_FORMAT        "json" (one object per line, the default) or "text"
+    MAS_LOG_SAMPLE_EVERY  Keep 1 in N verbose records per call site (default 100)
+    MAS_LOG_SAMPLE_LEVEL  Records at or below this level are verbose (default DEBUG)
+    MAS_LOG_QUEUE_SIZE    Records buffered before new ones are dropped (default 10000)
+
+Worker processes call configure_logging() again to get their own writer.
+"""
+from typing import Dict, Any, Optional, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional["_NonBlockingQueueHandler"] = None
+_configure_lock = threading.Lock()
+
+
+class LazyJSON:
+    """A value rendered as JSON only if the log record it is passed to is emitted"""
+
+    __slots__ = ("value", "indent")
+
+    def __init__(self, value: Any, indent: Optional[int] = None):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self) -> str:
+        return json.dumps(self.value, indent=self.indent, default=str)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Let through 1 in every N records at or below a level, counted per call site"""
+
+    def __init__(self, every: int, level: int = logging.DEBUG):
+        super().__init__()
+        self.every = max(1, every)
+        self.level = level
+        self._counts: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        # Unlocked: a lost increment under contention only shifts the sample
+        count = self._counts.get(site, 0)
+        self._counts[site] = count + 1
+        if count % self.every:
+            return False
+        if count:
+            record.sampled = f"1/{self.every}"
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that defers formatting to the listener and drops records when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The base class formats here, on the caller's thread; the listener does it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level: Optional[str] = None, stream=None) -> QueueListener:
+    """Install the queue handler on the root logger and start the writer thread; idempotent"""
+    global _listener, _handler
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        level_name = (level or os.environ.get("MAS_LOG_LEVEL", "INFO")).upper()
+        if os.environ.get("MAS_LOG_FORMAT", "json").lower() == "text":
+            formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        else:
+            formatter = JSONFormatter()
+        writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=int(os.environ.get("MAS_LOG_QUEUE_SIZE", "10000")))
+        _handler = _NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(SampleFilter(
+            int(os.environ.get("MAS_LOG_SAMPLE_EVERY", "100")),
+            logging.getLevelName(os.environ.get("MAS_LOG_SAMPLE_LEVEL", "DEBUG").upper())
+        ))
+
+        root = logging.getLogger()
+        root.setLevel(level_name)
+        root.addHandler(_handler)
+        _listener = QueueListener(log_queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener, _handler
+    with _configure_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = _handler = None
+
+
+def _forget_in_child():
+    """A forked child has the queue handler but not the writer thread; start over there"""
+    global _listener, _handler, _configure_lock
+    _configure_lock = threading.Lock()
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _listener = _handler = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_in_child)
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Records waiting for the writer and records dropped because the queue was full"""
+    if _handler is None:
+        return {"configured": False}
+    return {"configured": True, "queued": _handler.queue.qsize(), "dropped": _handler.dropped}
@@ -0,0 +1,330 @@
+from typing import Dict, Any, Callable, List, Optional, TYPE_CHECKING
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import cached_property
+
+from agents.registry import AgentRegistry, default_registry, run_agent
+from agents.text_cache import PageTextCache
+from mcp.admission import AdmissionRejected
+from mcp.scheduler import assign_priority
+
+if TYPE_CHECKING:
+    from agents.classifier import ClassifierAgent
+    from memory.store import MemoryStore
+    from mcp.action_router import ActionRouter
+    from mcp.admission import AdmissionController, Ticket
+    from mcp.pools import AgentPools
+
+
+class DocumentPipeline:
+    """Classifier -> agent -> action router pipeline shared by the API and the batch CLI.
+
+    Extraction agents come from an AgentRegistry. With pools, each agent
+    runs in its own worker pool; without, agents run in the calling thread.
+    Agents and the parsers they depend on are imported and constructed on
+    first use, so creating a pipeline is cheap; call warm_up() to pay that
+    cost ahead of the first document.
+
+    Email attachments are processed as child conversations of the email,
+    several at a time, each admitted by admission if one is given; see
+    process_attachments().
+    """
+
+    # Attachments of attachments are followed this many levels deep
+    MAX_ATTACHMENT_DEPTH = 3
+
+    def __init__(
+        self,
+        memory: Optional["MemoryStore"] = None,
+        registry: Optional[AgentRegistry] = None,
+        pools: Optional["AgentPools"] = None,
+        attachment_workers: Optional[int] = None,
+        admission: Optional["AdmissionController"] = None
+    ):
+        self.memory = memory
+        self.registry = registry or default_registry()
+        self.pools = pools
+        self.admission = admission
+        self.attachment_workers = attachment_workers or int(os.environ.get("MAS_ATTACHMENT_WORKERS", "4"))
+
+    @cached_property
+    def classifier(self) -> "ClassifierAgent":
+        from agents.classifier import ClassifierAgent
+        return ClassifierAgent(registry=self.registry)
+
+    @cached_property
+    def action_router(self) -> "ActionRouter":
+        from mcp.action_router import ActionRouter
+        return ActionRouter()
+
+    def warm_up(self):
+        """Construct every agent, start the worker pools and load the memory store"""
+        self.classifier
+        self.action_router
+        for spec in self.registry.specs():
+            self.registry.agent(spec.name)
+        import PyPDF2  # noqa: F401
+        if self.pools is not None:
+            self.pools.warm_up()
+        if self.memory is not None:
+            self.memory.load()
+
+    def pre_classify(self, head: bytes) -> Dict[str, str]:
+        """Cheap format, intent and urgency guess from the first 4 KB, used for scheduling.
+
+        Blocking (keyword scans, and loading the agents on first use); call it
+        from a worker thread.
+        """
+        fmt = self.classifier.sniff_format(head)
+        return {
+            "format": fmt,
+            "intent": self.classifier.sniff_intent(head),
+            "urgency": self.registry.agent("email_agent").sniff_urgency(head) if fmt == "email" else "normal"
+        }
+
+    def process(
+        self,
+        content: bytes,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        description: Optional[str] = None,
+        conversation_id: Optional[str] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        parent_id: Optional[str] = None,
+        depth: int = 0,
+        inline: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run one document through the pipeline
+
+        Args:
+            content: Raw document bytes
+            filename: Original file name, if known
+            content_type: MIME type reported by the client, if known
+            description: Free-text description supplied with the upload
+            conversation_id: ID to record the run under; generated if omitted
+            on_event: Optional callback invoked as on_event(stage, data) as
+                the document advances: "classified", "page_extracted",
+                "extracted", "actions_routed", "attachment_processed" and "stored"
+            parent_id: Conversation of the email this document is attached to
+            depth: Attachment nesting level, 0 for an upload
+            inline: Run the extraction agent in the calling thread instead
+                of its worker pool, so a profiler sees its work
+
+        Returns:
+            Dict with the conversation ID, classification, extraction result,
+            routed actions and, for emails, per-attachment summaries. Raises
+            ValueError for unsupported formats.
+        """
+        conversation_id = conversation_id or str(uuid.uuid4())
+        emit = on_event or (lambda stage, data: None)
+        # Hashed once here for the blob store, the text cache and the agents
+        digest = PageTextCache.key(content)
+
+        # Store initial metadata
+        if self.memory is not None:
+            metadata = {
+                "filename": filename,
+                "content_type": content_type,
+                "description": description,
+                "size": len(content),
+                "upload_time": datetime.now().isoformat()
+            }
+            if parent_id is not None:
+                metadata["parent_id"] = parent_id
+            self.memory.add_conversation(conversation_id, metadata, raw=content, raw_digest=digest)
+
+        # Classify document
+        classification = self.classifier.classify(content, digest)
+        self._record(conversation_id, {
+            "classification": classification,
+            "rules_version": self.classifier.RULES_VERSION
+        })
+        emit("classified", {"classification": classification})
+
+        # Process with appropriate agent
+        result = self.extract(content, classification, on_event=emit, inline=inline)
+        actions = None
+        attachments = None
+
+        if result:
+            spec = self.registry.for_format(classification["format"])
+            # The classifier does not parse uncached PDFs; the agent counted the pages
+            if classification["format"] == "pdf" and result.get("success"):
+                pages = result["data"].get("metadata", {}).get("pages")
+                metadata = classification["metadata"]
+                if pages is not None and "pages" not in metadata["format_details"]:
+                    # A copy; the recorded classification may be held by the store
+                    classification = {**classification, "metadata": {
+                        **metadata, "format_details": {**metadata["format_details"], "pages": pages}
+                    }}
+            self._record(conversation_id, {
+                "extraction": result,
+                "agent": spec.name,
+                "rules_version": spec.rules_version
+            })
+            emit("extracted", {"result": result})
+
+            # Route to follow-up actions
+            actions = self.action_router.route_action(result, classification)
+            emit("actions_routed", {"actions": actions})
+            self._record(conversation_id, {
+                "actions": actions,
+                "rules_version": self.action_router.RULES_VERSION
+            })
+
+            if (classification["format"] == "email" and result.get("attachments")
+                    and depth < self.MAX_ATTACHMENT_DEPTH):
+                attachments = self.process_attachments(content, conversation_id, depth, emit)
+                self._record(conversation_id, {"attachments": attachments})
+
+        emit("stored", {"conversation_id": conversation_id})
+
+        return {
+            "conversation_id": conversation_id,
+            "classification": classification,
+            "result": result,
+            "actions": actions,
+            "attachments": attachments
+        }
+
+    def process_attachments(
+        self,
+        content: bytes,
+        parent_id: str,
+        depth: int = 0,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run each attachment of an email through the pipeline as a child conversation
+
+        Attachments are decoded one at a time as the email is walked and
+        processed attachment_workers at a time, so at most that many are
+        held in memory; each is classified and extracted by its own agent,
+        in that agent's pool. With an admission controller, each decoded
+        attachment waits for a slot in its format's lane and counts against
+        the byte budget before it is dispatched. Attachments over the email
+        agent's size or count limits are listed but not processed.
+
+        Returns:
+            One summary per attachment, in order: filename, content type,
+            size and either the child conversation's ID, format and intent,
+            an error, or why it was skipped
+        """
+        emit = on_event or (lambda stage, data: None)
+        email_agent = self.registry.agent("email_agent")
+        window = threading.BoundedSemaphore(self.attachment_workers)
+        summaries = []
+        pending = []
+
+        attachments = email_agent.iter_attachments(content)
+
+        with ThreadPoolExecutor(max_workers=self.attachment_workers, thread_name_prefix="attachment") as executor:
+            while True:
+                # Wait for a free worker before decoding the next attachment
+                window.acquire()
+                attachment = next(attachments, None)
+                if attachment is None:
+                    window.release()
+                    break
+                summary = {key: attachment[key] for key in ("index", "filename", "content_type", "size")}
+                if "skipped" in attachment:
+                    window.release()
+                    summary["skipped"] = attachment["skipped"]
+                    summaries.append(summary)
+                    continue
+                try:
+                    ticket = self._admit_attachment(attachment)
+                except AdmissionRejected as e:
+                    window.release()
+                    summary.update({"success": False, "error": e.reason})
+                    summaries.append(summary)
+                    emit("attachment_processed", summary)
+                    continue
+                future = executor.submit(self._process_attachment, attachment, parent_id, depth)
+                future.add_done_callback(lambda _, ticket=ticket: self._finish_attachment(window, ticket))
+                pending.append((summary, future))
+                # The worker holds the only reference to the decoded bytes
+                del attachment
+
+            for summary, future in pending:
+                summary.update(future.result())
+                summaries.append(summary)
+                emit("attachment_processed", summary)
+
+        return sorted(summaries, key=lambda summary: summary["index"])
+
+    def _admit_attachment(self, attachment: Dict[str, Any]) -> Optional["Ticket"]:
+        """Block until the admission controller lets a decoded attachment through.
+
+        A forwarded email is charged bytes only: waiting for an email slot
+        while its parent holds one could deadlock the email lane. Raises
+        AdmissionRejected if the attachment is rejected or times out.
+        """
+        if self.admission is None:
+            return None
+        pre_classification = self.pre_classify(attachment["content"][:4096])
+        if pre_classification["format"] == "email":
+            return self.admission.charge("email", attachment["size"])
+        ticket = self.admission.admit(
+            pre_classification["format"], attachment["size"], assign_priority(pre_classification)
+        )
+        try:
+            ticket.wait_blocking()
+        except AdmissionRejected:
+            ticket.release()
+            raise
+        return ticket
+
+    @staticmethod
+    def _finish_attachment(window: threading.BoundedSemaphore, ticket: Optional["Ticket"]):
+        if ticket is not None:
+            ticket.release()
+        window.release()
+
+    def _process_attachment(self, attachment: Dict[str, Any], parent_id: str, depth: int) -> Dict[str, Any]:
+        child_id = str(uuid.uuid4())
+        try:
+            processed = self.process(
+                attachment["content"],
+                filename=attachment["filename"],
+                content_type=attachment["content_type"],
+                description=f"Attachment {attachment['index']} of {parent_id}",
+                conversation_id=child_id,
+                parent_id=parent_id,
+                depth=depth + 1
+            )
+        except Exception as e:
+            return {"conversation_id": child_id, "success": False, "error": str(e)}
+        return {
+            "conversation_id": child_id,
+            "success": True,
+            "format": processed["classification"]["format"],
+            "intent": processed["classification"]["intent"]
+        }
+
+    def extract(
+        self,
+        content: bytes,
+        classification: Dict[str, Any],
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        inline: bool = False
+    ) -> Dict[str, Any]:
+        """Dispatch content to the registered agent for its format, in its pool unless inline"""
+        spec = self.registry.for_format(classification["format"])
+        if spec is None:
+            raise ValueError(f"Unsupported format: {classification['format']}")
+
+        progress = None
+        if on_event is not None:
+            progress = lambda page, pages: on_event("page_extracted", {"page": page, "pages": pages})
+        if self.pools is not None and not inline:
+            return self.pools.run(spec, content, classification, progress)
+        return run_agent(spec, content, classification, progress)
+
+    def _record(self, conversation_id: str, agent_output: Dict[str, Any]):
+        if self.memory is not None:
+            self.memory.update_conversation(conversation_id, agent_output)
@@ -0,0 +1,160 @@
+from typing import Dict, Any, Callable, Optional
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from agents.registry import AgentRegistry, AgentSpec, get_agent, run_agent
+from mcp.logs import configure_logging
+
+# Progress queue of a process-pool worker, set by _init_process_worker
+_worker_progress = None
+
+
+def _init_process_worker(progress_queue):
+    global _worker_progress
+    _worker_progress = progress_queue
+    configure_logging()
+
+
+def _run_in_process(spec: AgentSpec, content: bytes, classification: Dict[str, Any],
+                    call_id: Optional[int]) -> Dict[str, Any]:
+    """Run an agent in a pool process, reporting progress as (call_id, page, pages)"""
+    if call_id is None:
+        return run_agent(spec, content, classification)
+    try:
+        return run_agent(
+            spec, content, classification,
+            lambda page, pages: _worker_progress.put((call_id, page, pages))
+        )
+    finally:
+        # Marks the end of this call's progress events
+        _worker_progress.put((call_id, None, None))
+
+
+class AgentPools:
+    """One sized worker pool per agent, so a flood of one format cannot starve the others.
+
+    Thread-pool agents share this process's agent instances; process-pool
+    agents get one instance per worker process. Progress callbacks from
+    process workers travel over a shared queue and are invoked here, on a
+    dispatcher thread, before run() returns.
+    """
+
+    def __init__(self, registry: AgentRegistry, start_method: str = "spawn"):
+        self.registry = registry
+        self._context = multiprocessing.get_context(start_method)
+        self._executors: Dict[str, Executor] = {}
+        self._lock = threading.Lock()
+        self._progress_queue = None
+        self._listeners: Dict[int, Callable[[int, int], None]] = {}
+        self._finished: Dict[int, threading.Event] = {}
+        self._call_ids = itertools.count()
+        self._dispatcher: Optional[threading.Thread] = None
+
+    def _executor(self, spec: AgentSpec) -> Executor:
+        executor = self._executors.get(spec.name)
+        if executor is not None:
+            return executor
+        with self._lock:
+            if spec.name not in self._executors:
+                if spec.pool == "process":
+                    self._executors[spec.name] = ProcessPoolExecutor(
+                        max_workers=spec.workers,
+                        mp_context=self._context,
+                        initializer=_init_process_worker,
+                        initargs=(self._progress(),)
+                    )
+                else:
+                    self._executors[spec.name] = ThreadPoolExecutor(
+                        max_workers=spec.workers, thread_name_prefix=spec.name
+                    )
+            return self._executors[spec.name]
+
+    def _progress(self):
+        """The shared progress queue, with its dispatcher thread; called with the lock held"""
+        if self._progress_queue is None:
+            self._progress_queue = self._context.Queue()
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name="agent-progress", daemon=True
+            )
+            self._dispatcher.start()
+        return self._progress_queue
+
+    def _dispatch(self):
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            call_id, page, pages = message
+            if page is None:
+                finished = self._finished.get(call_id)
+                if finished is not None:
+                    finished.set()
+                continue
+            listener = self._listeners.get(call_id)
+            if listener is not None:
+                try:
+                    listener(page, pages)
+                except Exception:
+                    pass
+
+    def run(self, spec: AgentSpec, content: bytes, classification: Dict[str, Any],
+            progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Run an agent on a document in its pool and wait for the result"""
+        executor = self._executor(spec)
+        if spec.pool != "process":
+            return executor.submit(run_agent, spec, content, classification, progress).result()
+
+        call_id = None
+        if progress is not None:
+            call_id = next(self._call_ids)
+            self._listeners[call_id] = progress
+            self._finished[call_id] = threading.Event()
+        try:
+            result = executor.submit(_run_in_process, spec, content, classification, call_id).result()
+            if call_id is not None:
+                # Deliver the remaining progress events before the caller moves on
+                self._finished[call_id].wait(timeout=5)
+            return result
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next document
+            with self._lock:
+                if self._executors.get(spec.name) is executor:
+                    del self._executors[spec.name]
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            if call_id is not None:
+                self._listeners.pop(call_id, None)
+                self._finished.pop(call_id, None)
+
+    def warm_up(self):
+        """Start every pool's workers now rather than on the first document"""
+        for spec in self.registry.specs():
+            executor = self._executor(spec)
+            if spec.pool == "process":
+                for future in [executor.submit(_warm_worker, spec) for _ in range(spec.workers)]:
+                    future.result()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Each agent's declared cost and pool, and whether its pool has started"""
+        return {
+            spec.name: {**spec.describe(), "started": spec.name in self._executors}
+            for spec in self.registry.specs()
+        }
+
+    def shutdown(self):
+        with self._lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+            self._executors.clear()
+            if self._progress_queue is not None:
+                self._progress_queue.put(None)
+                self._dispatcher.join()
+                self._progress_queue = None
+
+
+def _warm_worker(spec: AgentSpec):
+    get_agent(spec)
@@ -0,0 +1,100 @@
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import cProfile
+import hmac
+import itertools
+import marshal
+import os
+import threading
+
+# Name of the profile artifact stored with a conversation
+PROFILE_ARTIFACT = "profile.pstats"
+
+
+class RequestProfiler:
+    """Opt-in cProfile runs of single requests.
+
+    A request is profiled when it asks to be and presents the configured
+    token, or when it is picked by 1-in-N sampling. The raw stats are kept
+    in pstats format so they open with ``python -m pstats`` or snakeviz.
+    """
+
+    def __init__(self, token: Optional[str] = None, sample_every: int = 0, top: int = 25):
+        self.token = token
+        self.sample_every = sample_every
+        self.top = top
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        """Build a profiler from MAS_PROFILE_TOKEN, MAS_PROFILE_SAMPLE_EVERY and MAS_PROFILE_TOP"""
+        env = os.environ.get
+        return cls(
+            token=env("MAS_PROFILE_TOKEN") or None,
+            sample_every=int(env("MAS_PROFILE_SAMPLE_EVERY", "0")),
+            top=int(env("MAS_PROFILE_TOP", "25")),
+        )
+
+    def authorized(self, token: Optional[str]) -> bool:
+        """True if token matches the configured one; always False when none is configured"""
+        return bool(self.token and token) and hmac.compare_digest(self.token.encode(), token.encode())
+
+    def should_profile(self, requested: bool, token: Optional[str]) -> Optional[str]:
+        """Why this request should be profiled ("requested" or "sampled"), or None.
+
+        Raises PermissionError if profiling was requested without a valid token.
+        """
+        if requested:
+            if not self.authorized(token):
+                raise PermissionError("Profiling requires a valid profile token")
+            return "requested"
+        if self.sample_every > 0:
+            with self._lock:
+                if next(self._counter) % self.sample_every == 0:
+                    return "sampled"
+        return None
+
+    def run(self, func: Callable, *args, **kwargs) -> Tuple[Any, Optional[Dict]]:
+        """Call func under cProfile; returns its result and the raw pstats dict.
+
+        cProfile only sees the calling thread, so run this in the thread that
+        does the work. The stats are None if another profiler is active.
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args, **kwargs), None
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profile.disable()
+        profile.create_stats()
+        return result, profile.stats
+
+    def summarize(self, stats: Dict) -> Dict[str, Any]:
+        """Hot functions by self time, with call counts and cumulative time"""
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)
+        hot_functions: List[Dict[str, Any]] = []
+        for (filename, line, name), (_, calls, self_time, cumulative, _) in rows[:self.top]:
+            location = name if filename == "~" else f"{name} ({os.path.basename(filename)}:{line})"
+            hot_functions.append({
+                "function": location,
+                "calls": calls,
+                "self_seconds": round(self_time, 6),
+                "cumulative_seconds": round(cumulative, 6)
+            })
+        return {
+            "total_seconds": round(sum(row[2] for row in stats.values()), 6),
+            "functions": len(stats),
+            "hot_functions": hot_functions
+        }
+
+
+def dump_stats(stats: Dict) -> bytes:
+    """Serialize stats exactly as pstats.Stats.dump_stats() writes them"""
+    return marshal.dumps(stats)
+
+
+def load_stats(data: bytes) -> Dict:
+    return marshal.loads(data)
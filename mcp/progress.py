@@ -0,0 +1,98 @@
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+# Stages after which a conversation's stream ends
+TERMINAL_STAGES = ("completed", "failed")
+
+
+class _Channel:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self.finished_at: Optional[float] = None
+
+
+class ProgressBroker:
+    """Fan-out of pipeline stage events to per-conversation subscribers.
+
+    publish() may be called from any thread (the pipeline runs in a worker
+    thread); subscribe() is an async iterator for the event loop. Every event
+    is kept until retention seconds after the conversation finishes, so a
+    client that connects late still receives the stages it missed.
+    """
+
+    def __init__(self, retention: float = 300.0):
+        self.retention = retention
+        self._channels: Dict[str, _Channel] = {}
+        self._lock = threading.Lock()
+
+    def open(self, conversation_id: str):
+        """Start accepting events and subscribers for a conversation"""
+        with self._lock:
+            self._prune()
+            self._channels.setdefault(conversation_id, _Channel())
+
+    def exists(self, conversation_id: str) -> bool:
+        with self._lock:
+            return conversation_id in self._channels
+
+    def publish(self, conversation_id: str, stage: str, data: Optional[Dict[str, Any]] = None):
+        """Record a stage event and push it to every current subscriber"""
+        event = {
+            "stage": stage,
+            "data": data or {},
+            "timestamp": datetime.now().isoformat()
+        }
+        with self._lock:
+            channel = self._channels.setdefault(conversation_id, _Channel())
+            channel.events.append(event)
+            if stage in TERMINAL_STAGES:
+                channel.finished_at = time.monotonic()
+            subscribers = list(channel.subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def subscribe(self, conversation_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield past and future events until a terminal stage.
+
+        Yields None every keepalive seconds without an event so callers can
+        keep the connection open.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            channel = self._channels.setdefault(conversation_id, _Channel())
+            backlog = list(channel.events)
+            channel.subscribers.append(subscriber)
+
+        try:
+            for event in backlog:
+                yield event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+        finally:
+            with self._lock:
+                if subscriber in channel.subscribers:
+                    channel.subscribers.remove(subscriber)
+
+    def _prune(self):
+        """Forget finished conversations past their retention window"""
+        cutoff = time.monotonic() - self.retention
+        for conversation_id in [
+            cid for cid, channel in self._channels.items()
+            if channel.finished_at is not None and channel.finished_at < cutoff
+            and not channel.subscribers
+        ]:
+            del self._channels[conversation_id]
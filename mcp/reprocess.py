@@ -0,0 +1,316 @@
+"""Replay stored conversations under the current classification, extraction and routing rules.
+
+Every agent and the action router carry a RULES_VERSION, recorded with each
+history entry. This streams the conversations of a MemoryStore, and for each
+one re-runs only the stages whose stored rules version is older than the
+current one (and the stages downstream of any result that changed), using
+the raw document where the store kept it. Actions are always simulated:
+replaying history never calls the downstream services.
+
+Writes a JSONL diff report with one record per conversation whose intent,
+extracted fields or actions would change. With --apply the new results are
+appended to those conversations' history; unchanged conversations are not
+rewritten. --apply needs the sharded store: the single-file store is
+rewritten whole on every save, so applying while a server writes to it
+would lose the server's writes.
+
+    python -m mcp.reprocess --report diff.jsonl --workers 8
+    python -m mcp.reprocess --shards 16 --memory-dir memory_shards --apply
+"""
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from multiprocessing import Pool
+
+# Add parent directory to path to import agents
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.registry import default_registry
+from mcp.batch import _Progress
+from mcp.logs import configure_logging
+from mcp.pipeline import DocumentPipeline
+from memory.blobs import BlobStore
+from memory.sharded import ShardedMemoryStore
+from memory.store import MemoryStore
+
+STAGES = ("classify", "extract", "route")
+# Keys that differ between runs, or only identify the input, and are not part of a result
+VOLATILE_KEYS = frozenset(["processed_at", "timestamp", "request_id", "upload_time", "sha256"])
+
+# One pipeline and blob store per worker process, built by _init_worker
+_pipeline: Optional[DocumentPipeline] = None
+_blob_store: Optional[BlobStore] = None
+
+
+def current_versions(pipeline: DocumentPipeline) -> Dict[str, Any]:
+    """Rules versions of the classifier, of each extraction agent and of the action router"""
+    from agents.classifier import ClassifierAgent
+    from mcp.action_router import ActionRouter
+    return {
+        "classify": ClassifierAgent.RULES_VERSION,
+        "agents": {spec.name: spec.rules_version for spec in pipeline.registry.specs()},
+        "route": ActionRouter.RULES_VERSION
+    }
+
+
+def stored_results(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """The latest classification, extraction and actions in a conversation's history.
+
+    Entries recorded before rules were versioned count as version 0.
+    """
+    stored = {
+        "classification": None, "classify_version": 0,
+        "extraction": None, "agent": None, "extract_version": 0,
+        "actions": None, "route_version": 0
+    }
+    for entry in conv.get("history", []):
+        output = entry["agent_output"]
+        version = output.get("rules_version", 0)
+        if "classification" in output:
+            stored.update(classification=output["classification"], classify_version=version)
+        if "extraction" in output:
+            stored.update(extraction=output["extraction"], agent=output.get("agent"),
+                          extract_version=version)
+        if "actions" in output:
+            stored.update(actions=output["actions"], route_version=version)
+    return stored
+
+
+def stale_stages(stored: Dict[str, Any], versions: Dict[str, Any], registry) -> List[str]:
+    """Stages whose stored result was produced under older rules"""
+    stale = []
+    if stored["classification"] is None or stored["classify_version"] != versions["classify"]:
+        stale.append("classify")
+    if stored["extraction"] is not None:
+        spec = registry.for_format((stored["classification"] or {}).get("format"))
+        if spec is None or spec.name != stored["agent"] or stored["extract_version"] != versions["agents"][spec.name]:
+            stale.append("extract")
+    if stored["actions"] is not None and stored["route_version"] != versions["route"]:
+        stale.append("route")
+    return stale
+
+
+def iter_jobs(memory: MemoryStore, versions: Dict[str, Any], registry,
+              force: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield a job for every conversation with a stale stage, or a forced one"""
+    for conversation_id, conv in memory.iter_conversations(resolve=True):
+        stored = stored_results(conv)
+        stale = stale_stages(stored, versions, registry)
+        for stage in force or []:
+            if stage not in stale:
+                stale.append(stage)
+        if not stale:
+            continue
+        yield {
+            "id": conversation_id,
+            "raw_blob": conv["metadata"].get("raw_blob"),
+            "stale": stale,
+            "versions": versions,
+            **stored
+        }
+
+
+def _init_worker(blob_dir: Optional[str]):
+    global _pipeline, _blob_store
+    configure_logging()
+    from mcp.action_router import ActionRouter
+    _pipeline = DocumentPipeline()
+    # Never call the downstream services while replaying
+    _pipeline.action_router = ActionRouter(live=False)
+    _blob_store = BlobStore(blob_dir) if blob_dir else None
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """Dotted-path leaves of a result, without the volatile keys"""
+    if isinstance(value, dict):
+        leaves = {}
+        for key, item in value.items():
+            if key not in VOLATILE_KEYS:
+                leaves.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return leaves
+    if isinstance(value, list) and value and all(isinstance(item, (dict, list)) for item in value):
+        leaves = {}
+        for index, item in enumerate(value):
+            leaves.update(_flatten(item, f"{prefix}[{index}]"))
+        return leaves
+    return {prefix: value}
+
+
+def diff_fields(old: Any, new: Any) -> Dict[str, List[Any]]:
+    """{path: [old, new]} for every leaf that differs"""
+    old_leaves, new_leaves = _flatten(old), _flatten(new)
+    return {
+        path: [old_leaves.get(path), new_leaves.get(path)]
+        for path in sorted(old_leaves.keys() | new_leaves.keys())
+        if old_leaves.get(path) != new_leaves.get(path)
+    }
+
+
+def _action_keys(actions: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    return sorted(
+        (action.get("service"), action.get("action"))
+        for action in (actions or {}).get("actions", [])
+    )
+
+
+def reprocess(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-run a conversation's stale stages in the worker's pipeline and diff the results"""
+    record = {"id": job["id"], "stale": job["stale"], "rerun": [], "skipped": []}
+    try:
+        content = None
+        if job["raw_blob"] and _blob_store is not None and _blob_store.exists(job["raw_blob"]):
+            content = _blob_store.get(job["raw_blob"])
+
+        classification = job["classification"]
+        if "classify" in job["stale"]:
+            if content is None:
+                record["skipped"].append("classify")
+            else:
+                classification = _pipeline.classifier.classify(content, job["raw_blob"])
+                record["rerun"].append("classify")
+
+        extraction, agent = job["extraction"], job["agent"]
+        classification_changed = bool(diff_fields(job["classification"], classification))
+        if classification is not None and (
+            "extract" in job["stale"]
+            or (classification_changed and job["extraction"] is not None)
+        ):
+            if content is None:
+                record["skipped"].append("extract")
+            else:
+                spec = _pipeline.registry.for_format(classification["format"])
+                if spec is None:
+                    # No agent handles the format (any more): nothing to extract
+                    extraction, agent = None, None
+                else:
+                    extraction, agent = _pipeline.extract(content, classification), spec.name
+                    record["rerun"].append("extract")
+
+        actions = job["actions"]
+        extraction_changed = bool(diff_fields(job["extraction"], extraction))
+        if extraction is not None and (
+            "route" in job["stale"] or classification_changed or extraction_changed
+        ):
+            actions = _pipeline.action_router.route_action(extraction, classification)
+            record["rerun"].append("route")
+
+        changes = {}
+        if classification_changed:
+            old, new = job["classification"] or {}, classification
+            changes["classification"] = diff_fields(old, new)
+            if old.get("intent") != new.get("intent"):
+                changes["intent"] = [old.get("intent"), new.get("intent")]
+        if extraction_changed:
+            changes["fields"] = diff_fields(job["extraction"], extraction)
+        old_actions, new_actions = _action_keys(job["actions"]), _action_keys(actions)
+        if old_actions != new_actions:
+            changes["actions"] = {
+                "added": [list(key) for key in new_actions if key not in old_actions],
+                "removed": [list(key) for key in old_actions if key not in new_actions]
+            }
+        elif "route" in record["rerun"] and diff_fields(job["actions"], actions):
+            changes["action_payloads"] = diff_fields(job["actions"], actions)
+
+        # History entries to append, as the pipeline records them, for stages whose result changed
+        versions = job["versions"]
+        updates = []
+        if classification_changed:
+            updates.append({"classification": classification, "rules_version": versions["classify"]})
+        if extraction is not None and extraction_changed:
+            updates.append({"extraction": extraction, "agent": agent,
+                            "rules_version": versions["agents"][agent]})
+        if "actions" in changes or "action_payloads" in changes:
+            updates.append({"actions": actions, "rules_version": versions["route"]})
+
+        record.update({"success": True, "changed": bool(changes), "changes": changes, "updates": updates})
+    except Exception as e:
+        record.update({"success": False, "changed": False, "error": str(e), "updates": []})
+
+    record["processed_at"] = datetime.now().isoformat()
+    return record
+
+
+def run(memory: MemoryStore, output, workers: int, chunksize: int, blob_dir: Optional[str],
+        apply: bool = False, force: Optional[List[str]] = None) -> _Progress:
+    """Reprocess stale conversations and write a JSONL record for each changed or failed one"""
+    progress = _Progress()
+    pipeline = DocumentPipeline(registry=default_registry())
+    jobs = iter_jobs(memory, current_versions(pipeline), pipeline.registry, force)
+    pending: List[Tuple[str, Dict[str, Any]]] = []
+
+    def emit(record):
+        updates = record.pop("updates")
+        if record["changed"] or not record["success"]:
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+        if apply and updates:
+            pending.extend((record["id"], update) for update in updates)
+            if len(pending) >= chunksize * max(workers, 1):
+                memory.update_conversations(pending)
+                pending.clear()
+        progress.update(record)
+
+    if workers <= 1:
+        _init_worker(blob_dir)
+        for job in jobs:
+            emit(reprocess(job))
+    else:
+        with Pool(workers, initializer=_init_worker, initargs=(blob_dir,)) as pool:
+            for record in pool.imap_unordered(reprocess, jobs, chunksize=chunksize):
+                emit(record)
+
+    if pending:
+        memory.update_conversations(pending)
+    progress.report()
+    return progress
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Re-run stored conversations under the current rules")
+    parser.add_argument("--memory", default="memory_store.json", help="Single-file store to read")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("MAS_MEMORY_SHARDS", "0")),
+                        help="Read a sharded store with this many shards instead (default: MAS_MEMORY_SHARDS)")
+    parser.add_argument("--memory-dir", default=os.environ.get("MAS_MEMORY_DIR", "memory_shards"),
+                        help="Directory of the sharded store")
+    parser.add_argument("--blob-dir", default=os.environ.get("MAS_BLOB_DIR", "blob_store"),
+                        help="Blob store holding the raw documents")
+    parser.add_argument("-o", "--report", default="-", help="JSONL diff report (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="Conversations handed to a worker at a time")
+    parser.add_argument("--force", default="",
+                        help=f"Comma-separated stages to re-run regardless of version: {','.join(STAGES)}")
+    parser.add_argument("--apply", action="store_true",
+                        help="Append the changed results to the conversations' history (sharded store only)")
+    args = parser.parse_args(argv)
+
+    force = [stage.strip() for stage in args.force.split(",") if stage.strip()]
+    unknown = [stage for stage in force if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage: {', '.join(unknown)}")
+    if args.apply and args.shards <= 0:
+        # Whichever process saves the single-file store last overwrites the other's writes
+        parser.error("--apply needs the sharded store (--shards); "
+                     "the single-file store cannot take writes alongside a running server")
+
+    blob_store = BlobStore(args.blob_dir)
+    if args.shards > 0:
+        memory = ShardedMemoryStore(args.memory_dir, shards=args.shards, blob_store=blob_store)
+    else:
+        memory = MemoryStore(args.memory, blob_store=blob_store)
+
+    if args.report == "-":
+        progress = run(memory, sys.stdout, args.workers, args.chunksize, args.blob_dir, args.apply, force)
+    else:
+        with open(args.report, "w") as output:
+            progress = run(memory, output, args.workers, args.chunksize, args.blob_dir, args.apply, force)
+
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+from typing import Dict, Any, Optional
+import time
+from collections import deque
+
+# Priority lanes, most urgent first
+PRIORITIES = ("high", "normal", "low")
+
+
+def assign_priority(pre_classification: Dict[str, str]) -> str:
+    """Pick a priority lane from a cheap pre-classification of the document.
+
+    Fraud risk and high-urgency documents jump the queue; routine policy
+    PDFs, which are the most expensive to process, yield to everything else.
+    """
+    if pre_classification.get("intent") == "fraud_risk" or pre_classification.get("urgency") == "high":
+        return "high"
+    if pre_classification.get("format") == "pdf" and pre_classification.get("intent") == "regulation":
+        return "low"
+    return "normal"
+
+
+class _WaitStats:
+    """Recent queue wait times for one priority lane"""
+
+    def __init__(self, window: int = 1024):
+        self.samples = deque(maxlen=window)
+        self.dequeued = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.dequeued += 1
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"dequeued": self.dequeued, "mean_wait_seconds": 0.0,
+                    "p95_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+        return {
+            "dequeued": self.dequeued,
+            "mean_wait_seconds": round(sum(ordered) / len(ordered), 3),
+            "p95_wait_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max_wait_seconds": round(ordered[-1], 3)
+        }
+
+
+class WeightedFairQueue:
+    """Priority lanes served by smooth weighted round-robin with starvation protection.
+
+    Items must carry ``priority`` and ``enqueued_at`` (a time.monotonic()
+    timestamp). Non-empty lanes are served in proportion to their weights,
+    except that any item that has waited longer than max_wait is served
+    first, oldest such item first.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, int]] = None, max_wait: float = 10.0):
+        self.weights = weights or {"high": 4, "normal": 2, "low": 1}
+        self.max_wait = max_wait
+        self.lanes = {priority: deque() for priority in self.weights}
+        self.stats = {priority: _WaitStats() for priority in self.weights}
+        self._credit = {priority: 0 for priority in self.weights}
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def __bool__(self) -> bool:
+        return any(self.lanes.values())
+
+    def push(self, item):
+        self.lanes[item.priority].append(item)
+
+    def remove(self, item):
+        self.lanes[item.priority].remove(item)
+
+    def pop(self):
+        """Dequeue the next item; raises IndexError when empty"""
+        now = time.monotonic()
+        candidates = [priority for priority, lane in self.lanes.items() if lane]
+        if not candidates:
+            raise IndexError("pop from an empty queue")
+
+        # Starvation protection: the lane whose head has waited longest past max_wait
+        overdue = [p for p in candidates if now - self.lanes[p][0].enqueued_at > self.max_wait]
+        if overdue:
+            chosen = min(overdue, key=lambda p: self.lanes[p][0].enqueued_at)
+        else:
+            # Smooth weighted round-robin across the non-empty lanes
+            total = 0
+            for priority in candidates:
+                self._credit[priority] += self.weights[priority]
+                total += self.weights[priority]
+            chosen = max(candidates, key=lambda p: self._credit[p])
+            self._credit[chosen] -= total
+
+        item = self.lanes[chosen].popleft()
+        self.stats[chosen].add(now - item.enqueued_at)
+        return item
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Depth and wait-time summary per priority lane"""
+        return {
+            priority: {"queue_depth": len(self.lanes[priority]), **self.stats[priority].summary()}
+            for priority in self.lanes
+        }
@@ -0,0 +1,171 @@
+from typing import Dict, Iterable, Iterator, Optional
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: reference counts are only safe within one process
+    fcntl = None
+
+# A lowercase hex SHA-256 digest, the only names blobs are stored under
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobStore:
+    """Content-addressed, reference-counted blob storage on disk.
+
+    Each blob is stored once under root/<aa>/<bb>/<sha256>, sharded by the
+    first two bytes of its hash. Reference counts live in root/refs.json;
+    collect() deletes blobs whose count has dropped to zero. Count updates
+    hold a file lock and re-read refs.json, so several processes can share
+    one store.
+    """
+
+    def __init__(self, root: str = "blob_store"):
+        self.root = Path(root)
+        self.refs_path = self.root / "refs.json"
+        self.lock_path = self.root / "refs.lock"
+        self._refs = None
+        self._lock = threading.RLock()
+
+    def path(self, digest: str) -> Path:
+        """Location of the blob with the given hash; raises ValueError unless digest is a SHA-256 hex digest"""
+        if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+            raise ValueError(f"Not a blob digest: {digest!r}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Store data if it is not already present and return its hash.
+
+        Pass digest if the caller has already hashed data with SHA-256.
+        """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file of our own first so readers never see a
+            # partial blob and concurrent writers of the same blob don't collide
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{digest}.", suffix=".tmp", dir=path.parent)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                if not path.exists():
+                    raise
+            finally:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+        return digest
+
+    def add(self, data: bytes, digest: Optional[str] = None) -> str:
+        """Store data and take a reference to it; returns its hash.
+
+        The reference is taken under the refs lock after checking the blob
+        is still there, so a concurrent collect() of an unreferenced copy
+        cannot delete it in between.
+        """
+        digest = self.put(data, digest)
+        with self._updating_refs() as refs:
+            if not self.path(digest).exists():
+                self.put(data, digest)
+            refs[digest] = refs.get(digest, 0) + 1
+        return digest
+
+    @contextmanager
+    def open(self, digest: str) -> Iterator[memoryview]:
+        """Memory-map a blob read-only for the duration of the context"""
+        with open(self.path(digest), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def get(self, digest: str) -> bytes:
+        """Read a blob's content"""
+        with self.open(digest) as view:
+            return view.tobytes()
+
+    @property
+    def refs(self) -> Dict[str, int]:
+        """Reference counts, loaded from disk on first access"""
+        if self._refs is None:
+            self._refs = self._load_refs()
+        return self._refs
+
+    def _load_refs(self) -> Dict[str, int]:
+        if self.refs_path.exists():
+            with open(self.refs_path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    @contextmanager
+    def _updating_refs(self):
+        """Hold the refs lock across processes, with the counts freshly read from disk"""
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refs = self._load_refs()
+                    yield self._refs
+                    self._save_refs()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_refs(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.refs_path.with_name(f"refs.json.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.refs, f)
+        os.replace(tmp_path, self.refs_path)
+
+    def incref(self, digest: str):
+        with self._updating_refs() as refs:
+            refs[digest] = refs.get(digest, 0) + 1
+
+    def decref(self, digest: str):
+        self.release([digest])
+
+    def release(self, digests: Iterable[str]):
+        """Drop one reference to each digest, saving the counts once"""
+        with self._updating_refs() as refs:
+            for digest in digests:
+                refs[digest] = max(refs.get(digest, 0) - 1, 0)
+
+    def collect(self) -> int:
+        """Delete blobs that are no longer referenced; returns how many were removed"""
+        removed = 0
+        with self._updating_refs() as refs:
+            for digest in [d for d, count in refs.items() if count <= 0]:
+                path = self.path(digest)
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                # Prune shard directories left empty
+                for directory in (path.parent, path.parent.parent):
+                    try:
+                        directory.rmdir()
+                    except OSError:
+                        break
+                del refs[digest]
+        return removed
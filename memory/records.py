@@ -0,0 +1,206 @@
+"""Compact in-memory form of a stored conversation.
+
+A conversation used to be held as a nest of dicts: a dict per history
+entry and per agent output, repeated string keys, ISO timestamp strings and
+the same format, intent and service names over and over. ConversationRecord
+keeps instead:
+
+- timestamps as epoch floats, the history's in an array('d');
+- the metadata, each history entry's agent output and each shared
+  sub-document as one compact JSON string, decoded only when asked for;
+- the fields read across every conversation (latest format, intent and
+  action types) as slots holding interned strings.
+
+Stores convert records to the dict shape, with ISO timestamps, only where
+conversations leave them: get_conversation(), iter_conversations() and the
+files on disk.
+"""
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import json
+import sys
+import time
+from array import array
+from datetime import datetime
+
+# Key marking a reference to a shared sub-document in a conversation's "documents"
+REF_KEY = "$doc"
+# Key marking a string kept in the blob store
+BLOB_KEY = "$blob"
+
+
+def encode(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+def to_epoch(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def to_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def _interned(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class ConversationRecord:
+    """One conversation: metadata, history, shared sub-documents and blob references"""
+
+    __slots__ = (
+        "_metadata", "created_at", "last_updated",
+        "format", "intent", "action_types",
+        "_timestamps", "_outputs", "documents", "blobs", "artifacts"
+    )
+
+    def __init__(self, metadata: Optional[Dict[str, Any]] = None,
+                 created_at: Optional[float] = None, last_updated: Optional[float] = None):
+        self._metadata = encode(metadata or {})
+        self.created_at = created_at if created_at is not None else time.time()
+        self.last_updated = last_updated if last_updated is not None else self.created_at
+        # Latest classification and routed actions, for scans over every conversation
+        self.format: Optional[str] = None
+        self.intent: Optional[str] = None
+        self.action_types: Tuple[str, ...] = ()
+        self._timestamps = array('d')
+        self._outputs: List[str] = []
+        # Created on first use; most conversations have neither documents nor artifacts
+        self.documents: Optional[Dict[str, str]] = None
+        self.blobs: Optional[List[str]] = None
+        self.artifacts: Optional[Dict[str, str]] = None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        """A decoded copy of the metadata; assign to change it"""
+        return json.loads(self._metadata)
+
+    @metadata.setter
+    def metadata(self, metadata: Dict[str, Any]):
+        self._metadata = encode(metadata)
+
+    def __len__(self) -> int:
+        """Number of history entries"""
+        return len(self._timestamps)
+
+    def append(self, agent_output: Dict[str, Any], timestamp: Optional[float] = None):
+        """Add a history entry, in stored form (sub-documents already replaced by references)"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        self._timestamps.append(timestamp)
+        self._outputs.append(encode(agent_output))
+        self.last_updated = timestamp
+        self._update_hot_fields(agent_output)
+
+    def _update_hot_fields(self, agent_output: Dict[str, Any]):
+        classification = self._deref(agent_output.get("classification"))
+        if isinstance(classification, dict):
+            self.format = _interned(classification.get("format"))
+            self.intent = _interned(classification.get("intent"))
+        if "actions" in agent_output:
+            actions = self._deref(agent_output["actions"]) or {}
+            self.action_types = tuple(
+                sys.intern(f"{action['service']}_{action['action']}")
+                for action in map(self._deref, self._deref(actions.get("actions")) or [])
+            )
+
+    def _deref(self, value: Any) -> Any:
+        """Decode value if it is a reference to a shared sub-document"""
+        if isinstance(value, dict) and len(value) == 1 and REF_KEY in value and self.documents:
+            encoded = self.documents.get(value[REF_KEY])
+            if encoded is not None:
+                return json.loads(encoded)
+        return value
+
+    def iter_history(self) -> Iterator[Dict[str, Any]]:
+        """Decode history entries one at a time, in stored form"""
+        for timestamp, output in zip(self._timestamps, self._outputs):
+            yield {"timestamp": to_iso(timestamp), "agent_output": json.loads(output)}
+
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        return list(self.iter_history())
+
+    def add_document(self, doc_id: str, value: Any) -> bool:
+        """Keep a shared sub-document; returns False if it was already kept"""
+        if self.documents is None:
+            self.documents = {}
+        elif doc_id in self.documents:
+            return False
+        self.documents[doc_id] = encode(value)
+        return True
+
+    def add_blob(self, digest: str) -> bool:
+        """Reference a blob; returns False if it was already referenced"""
+        if self.blobs is None:
+            self.blobs = []
+        elif digest in self.blobs:
+            return False
+        self.blobs.append(digest)
+        return True
+
+    def references(self) -> "ConversationRecord":
+        """An empty record sharing nothing but copies of this one's documents and blobs"""
+        scratch = ConversationRecord()
+        scratch.documents = dict(self.documents) if self.documents else None
+        scratch.blobs = list(self.blobs) if self.blobs else None
+        return scratch
+
+    def to_dict(self, history: Optional[List[Dict[str, Any]]] = None,
+                references: bool = True) -> Dict[str, Any]:
+        """The conversation as plain dicts with ISO timestamps.
+
+        Args:
+            history: History to include instead of the stored entries, e.g.
+                with references resolved
+            references: Include the "documents" and "blobs" maps
+        """
+        conv = {
+            "metadata": self.metadata,
+            "history": history if history is not None else self.history,
+            "created_at": to_iso(self.created_at),
+            "last_updated": to_iso(self.last_updated)
+        }
+        if references and self.documents:
+            conv["documents"] = {doc_id: json.loads(doc) for doc_id, doc in self.documents.items()}
+        if references and self.blobs:
+            conv["blobs"] = list(self.blobs)
+        if self.artifacts:
+            conv["artifacts"] = dict(self.artifacts)
+        return conv
+
+    def to_json(self) -> str:
+        """to_dict() as compact JSON, spliced from the encoded parts without decoding them"""
+        parts = [
+            '{"metadata":', self._metadata,
+            ',"history":[',
+            ','.join(
+                f'{{"timestamp":"{to_iso(timestamp)}","agent_output":{output}}}'
+                for timestamp, output in zip(self._timestamps, self._outputs)
+            ),
+            '],"created_at":"', to_iso(self.created_at),
+            '","last_updated":"', to_iso(self.last_updated), '"'
+        ]
+        if self.documents:
+            parts.append(',"documents":{')
+            parts.append(','.join(f'{json.dumps(doc_id)}:{doc}' for doc_id, doc in self.documents.items()))
+            parts.append('}')
+        if self.blobs:
+            parts.append(f',"blobs":{encode(self.blobs)}')
+        if self.artifacts:
+            parts.append(f',"artifacts":{encode(self.artifacts)}')
+        parts.append('}')
+        return ''.join(parts)
+
+    @classmethod
+    def from_dict(cls, conv: Dict[str, Any]) -> "ConversationRecord":
+        """Build a record from the dict shape written by to_dict() or to_json()"""
+        record = cls(conv["metadata"], to_epoch(conv["created_at"]), to_epoch(conv["last_updated"]))
+        for doc_id, doc in conv.get("documents", {}).items():
+            record.add_document(doc_id, doc)
+        for digest in conv.get("blobs", []):
+            record.add_blob(digest)
+        if conv.get("artifacts"):
+            record.artifacts = dict(conv["artifacts"])
+        for entry in conv["history"]:
+            record.append(entry["agent_output"], to_epoch(entry["timestamp"]))
+        record.last_updated = to_epoch(conv["last_updated"])
+        return record
@@ -0,0 +1,402 @@
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: shards are only safe within one process
+    fcntl = None
+
+from memory.blobs import BlobStore
+from memory.records import ConversationRecord, to_epoch
+from memory.store import MemoryStore
+
+
+# The op and ID every log record starts with, read without decoding the rest
+_RECORD_HEAD = re.compile(rb'\{"op":"([a-z]+)","id":"([^"\\]*)"')
+
+
+class _Shard:
+    """One shard's log and lock files, this process's index of the log and, once read in bulk, its replay"""
+
+    def __init__(self, root: Path, index: int):
+        self.log_path = root / f"shard-{index:03d}.jsonl"
+        self.lock_path = root / f"shard-{index:03d}.lock"
+        # Conversation ID -> (offset, length) of its log lines since its create record
+        self.index: Dict[str, List[Tuple[int, int]]] = {}
+        # Bytes of the log indexed so far, and the inode they came from
+        self.offset = 0
+        self.inode: Optional[int] = None
+        # Set when the log ends in a partial line left by a crashed writer
+        self.torn = False
+        # Every conversation, replayed up to replayed bytes; only bulk reads use it
+        self.conversations: Dict[str, ConversationRecord] = {}
+        self.replayed = 0
+        # Recently decoded conversations: ID -> (offset of its create line, lines applied, record)
+        self.recent: "OrderedDict[str, Tuple[int, int, ConversationRecord]]" = OrderedDict()
+        self.lock = threading.RLock()
+
+    def reset(self, inode: Optional[int] = None):
+        """Forget everything read from a log that was replaced or removed"""
+        self.index, self.offset, self.inode, self.torn = {}, 0, inode, False
+        self.conversations, self.replayed = {}, 0
+        self.recent.clear()
+
+
+class ShardedMemoryStore(MemoryStore):
+    """MemoryStore partitioned across append-only shard logs, safe for several processes.
+
+    A conversation lives in the shard picked by its ID's leading hex digits.
+    Each shard is a JSONL log of operations (create, update, artifact,
+    delete) guarded by its own file lock: writers append under an exclusive
+    lock, readers take a shared lock, so every process sees the others'
+    writes and workers writing to different shards never wait on each other.
+
+    Under the lock, a process only indexes new log lines by the op and ID at
+    their start; a conversation is decoded from its own lines when it is read
+    or updated, so a write costs the same however many other workers append
+    to the shard. Bulk reads (iter_conversations(), iter_summaries()) replay
+    the whole log instead, and the process then keeps every conversation in
+    memory. compact() rewrites logs down to one record per conversation;
+    expire() does so after dropping old conversations.
+    """
+
+    # Decoded conversations kept per shard, so a document's successive updates skip decoding
+    RECENT_CONVERSATIONS = 32
+
+    def __init__(
+        self,
+        root: str = "memory_shards",
+        shards: int = 16,
+        ref_threshold: int = 256,
+        blob_store: Optional[BlobStore] = None,
+        blob_threshold: int = 4096
+    ):
+        super().__init__(
+            storage_path=root,
+            ref_threshold=ref_threshold,
+            blob_store=blob_store,
+            blob_threshold=blob_threshold
+        )
+        self.root = Path(root)
+        self.shards = [_Shard(self.root, index) for index in range(shards)]
+
+    def _shard(self, conversation_id: str) -> _Shard:
+        try:
+            key = int(conversation_id.replace("-", "")[:8], 16)
+        except ValueError:
+            key = zlib.crc32(conversation_id.encode('utf-8'))
+        return self.shards[key % len(self.shards)]
+
+    @contextmanager
+    def _locked(self, shard: _Shard, exclusive: bool = False):
+        """Hold a shard's lock, across threads and processes, with its log indexed"""
+        with shard.lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(shard.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    self._scan(shard)
+                    yield shard
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _scan(self, shard: _Shard):
+        """Index log lines written since the last scan, by any process"""
+        try:
+            stat = os.stat(shard.log_path)
+        except FileNotFoundError:
+            shard.reset()
+            return
+        if stat.st_ino != shard.inode or stat.st_size < shard.offset:
+            # The log was compacted (or replaced) since we last read it
+            shard.reset(stat.st_ino)
+        if stat.st_size == shard.offset:
+            return
+
+        with open(shard.log_path, 'rb') as f:
+            f.seek(shard.offset)
+            data = f.read(stat.st_size - shard.offset)
+        end = data.rfind(b'\n') + 1
+        offset = shard.offset
+        for line in data[:end - 1].split(b'\n') if end else ():
+            self._index_line(shard.index, line, offset)
+            offset += len(line) + 1
+        shard.offset += end
+        shard.torn = end < len(data)
+
+    @staticmethod
+    def _index_line(index: Dict[str, List[Tuple[int, int]]], line: bytes, offset: int):
+        if not line.endswith(b'}'):
+            # A line torn by a crashed writer
+            return
+        head = _RECORD_HEAD.match(line)
+        if head is not None:
+            op, conversation_id = head.group(1).decode('ascii'), head.group(2).decode('utf-8')
+        else:
+            # An ID with escapes in it
+            try:
+                record = json.loads(line)
+                op, conversation_id = record["op"], record["id"]
+            except (ValueError, KeyError, TypeError):
+                return
+        if op == "create":
+            index[conversation_id] = [(offset, len(line))]
+        elif op == "delete":
+            index.pop(conversation_id, None)
+        elif conversation_id in index:
+            index[conversation_id].append((offset, len(line)))
+
+    def _load(self, shard: _Shard, conversation_id: str, log=None) -> Optional[ConversationRecord]:
+        """Decode one conversation from its indexed log lines; call with the lock held.
+
+        The last RECENT_CONVERSATIONS decoded per shard are kept and only
+        their new lines applied on the next load.
+        """
+        lines = shard.index.get(conversation_id)
+        if not lines:
+            return None
+        recent = shard.recent.get(conversation_id)
+        if recent is not None and recent[0] == lines[0][0] and recent[1] <= len(lines):
+            created, applied, conv = recent
+            shard.recent.move_to_end(conversation_id)
+        else:
+            created, applied, conv = lines[0][0], 0, None
+        if applied < len(lines):
+            if log is None:
+                with open(shard.log_path, 'rb') as log:
+                    return self._load(shard, conversation_id, log)
+            conversations = {conversation_id: conv} if conv is not None else {}
+            for offset, length in lines[applied:]:
+                log.seek(offset)
+                try:
+                    record = json.loads(log.read(length))
+                except ValueError:
+                    continue
+                self._apply(conversations, record)
+            conv = conversations.get(conversation_id)
+            if conv is None:
+                shard.recent.pop(conversation_id, None)
+                return None
+            shard.recent[conversation_id] = (created, len(lines), conv)
+            shard.recent.move_to_end(conversation_id)
+            if len(shard.recent) > self.RECENT_CONVERSATIONS:
+                shard.recent.popitem(last=False)
+        return conv
+
+    def _replay(self, shard: _Shard) -> Dict[str, ConversationRecord]:
+        """Every conversation in the shard, applying indexed lines not yet replayed; call with the lock held"""
+        if shard.replayed < shard.offset:
+            with open(shard.log_path, 'rb') as f:
+                f.seek(shard.replayed)
+                data = f.read(shard.offset - shard.replayed)
+            for line in data.split(b'\n'):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line torn by a crashed writer
+                    continue
+                self._apply(shard.conversations, record)
+            shard.replayed = shard.offset
+        return shard.conversations
+
+    @staticmethod
+    def _apply(conversations: Dict[str, ConversationRecord], record: Dict[str, Any]):
+        op = record["op"]
+        conversation_id = record["id"]
+        if op == "create":
+            conversations[conversation_id] = ConversationRecord.from_dict(record["conversation"])
+            return
+        if op == "delete":
+            conversations.pop(conversation_id, None)
+            return
+
+        conv = conversations.get(conversation_id)
+        if conv is None:
+            return
+        for doc_id, doc in record.get("documents", {}).items():
+            conv.add_document(doc_id, doc)
+        for digest in record.get("blobs", []):
+            conv.add_blob(digest)
+        if op == "update":
+            entry = record["entry"]
+            conv.append(entry["agent_output"], to_epoch(entry["timestamp"]))
+            conv.last_updated = to_epoch(record["last_updated"])
+        elif op == "artifact":
+            if conv.artifacts is None:
+                conv.artifacts = {}
+            conv.artifacts[record["name"]] = record["digest"]
+
+    def _append(self, shard: _Shard, record: Dict[str, Any]):
+        """Write a record to the shard log; call with the exclusive lock held"""
+        line = json.dumps(record, separators=(',', ':'), default=str).encode('utf-8')
+        with open(shard.log_path, 'ab') as f:
+            if shard.torn:
+                # Terminate the partial line so this record starts cleanly
+                f.write(b'\n')
+            offset = f.tell()
+            f.write(line + b'\n')
+            shard.offset = f.tell()
+            shard.inode = os.fstat(f.fileno()).st_ino
+        shard.torn = False
+        self._index_line(shard.index, line, offset)
+
+    def load(self):
+        """Index every shard now rather than on first access"""
+        for shard in self.shards:
+            with self._locked(shard):
+                pass
+
+    def _get(self, conversation_id: str) -> Optional[ConversationRecord]:
+        shard = self._shard(conversation_id)
+        with self._locked(shard):
+            return self._load(shard, conversation_id)
+
+    def add_conversation(self, conversation_id: str, metadata: Dict[str, Any], raw: Optional[bytes] = None,
+                         raw_digest: Optional[str] = None):
+        """Create a new conversation entry, keeping the raw document if a blob store is configured.
+
+        raw_digest is the SHA-256 of raw, if the caller has already computed it.
+        """
+        conv = ConversationRecord()
+        if raw is not None and self.blob_store is not None:
+            metadata["raw_blob"] = self._put_blob(conv, raw, raw_digest)
+        conv.metadata = metadata
+        shard = self._shard(conversation_id)
+        with self._locked(shard, exclusive=True):
+            self._append(shard, {"op": "create", "id": conversation_id, "conversation": conv.to_dict()})
+
+    def update_conversation(self, conversation_id: str, agent_output: Dict[str, Any]):
+        """Add new agent output to conversation history"""
+        shard = self._shard(conversation_id)
+        with self._locked(shard, exclusive=True):
+            conv = self._load(shard, conversation_id)
+            if conv is None:
+                raise KeyError(f"Conversation {conversation_id} not found")
+
+            # Intern into a copy so only the new documents and blobs are logged
+            scratch = conv.references()
+            entry = {
+                "timestamp": datetime.now().isoformat(),
+                "agent_output": {
+                    key: self._intern(value, scratch) for key, value in agent_output.items()
+                }
+            }
+            known_documents = conv.documents or {}
+            self._append(shard, {
+                "op": "update",
+                "id": conversation_id,
+                "entry": entry,
+                "documents": {
+                    doc_id: json.loads(doc) for doc_id, doc in (scratch.documents or {}).items()
+                    if doc_id not in known_documents
+                },
+                "blobs": (scratch.blobs or [])[len(conv.blobs or []):],
+                "last_updated": entry["timestamp"]
+            })
+
+    def update_conversations(self, updates: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Add agent output to several conversations; each is appended to its shard's log"""
+        for conversation_id, agent_output in updates:
+            self.update_conversation(conversation_id, agent_output)
+
+    def add_artifact(self, conversation_id: str, name: str, data: bytes) -> Optional[str]:
+        """Keep a file produced while processing a conversation, such as a profile.
+
+        Returns the blob hash, or None if no blob store is configured.
+        """
+        if self.blob_store is None:
+            return None
+        shard = self._shard(conversation_id)
+        with self._locked(shard, exclusive=True):
+            conv = self._load(shard, conversation_id)
+            if conv is None:
+                raise KeyError(f"Conversation {conversation_id} not found")
+            scratch = conv.references()
+            digest = self._put_blob(scratch, data)
+            self._append(shard, {
+                "op": "artifact",
+                "id": conversation_id,
+                "name": name,
+                "digest": digest,
+                "blobs": (scratch.blobs or [])[len(conv.blobs or []):]
+            })
+            return digest
+
+    def expire(self, max_age: timedelta) -> int:
+        """Drop conversations not updated within max_age, compact the shards and garbage-collect blobs.
+
+        Returns the number of conversations removed.
+        """
+        cutoff = (datetime.now() - max_age).timestamp()
+        removed = 0
+        released: List[str] = []
+        for shard in self.shards:
+            with self._locked(shard, exclusive=True):
+                expired = []
+                if shard.index:
+                    with open(shard.log_path, 'rb') as log:
+                        for conversation_id in list(shard.index):
+                            conv = self._load(shard, conversation_id, log)
+                            if conv is not None and conv.last_updated < cutoff:
+                                expired.append(conversation_id)
+                                released.extend(conv.blobs or [])
+                for conversation_id in expired:
+                    self._append(shard, {"op": "delete", "id": conversation_id})
+                if expired:
+                    self._compact(shard)
+                removed += len(expired)
+        if released and self.blob_store is not None:
+            self.blob_store.release(released)
+            self.blob_store.collect()
+        return removed
+
+    def compact(self):
+        """Rewrite every shard log as one create record per live conversation"""
+        for shard in self.shards:
+            with self._locked(shard, exclusive=True):
+                self._compact(shard)
+
+    def _compact(self, shard: _Shard):
+        if not shard.log_path.exists():
+            return
+        tmp_path = shard.log_path.with_name(f"{shard.log_path.name}.{os.getpid()}.tmp")
+        index = {}
+        with open(shard.log_path, 'rb') as log, open(tmp_path, 'wb') as f:
+            for conversation_id in shard.index:
+                conv = self._load(shard, conversation_id, log)
+                if conv is None:
+                    continue
+                line = (
+                    f'{{"op":"create","id":{json.dumps(conversation_id)},"conversation":{conv.to_json()}}}'
+                    .encode('utf-8')
+                )
+                index[conversation_id] = [(f.tell(), len(line))]
+                f.write(line + b'\n')
+            offset = f.tell()
+        os.replace(tmp_path, shard.log_path)
+        shard.reset(os.stat(shard.log_path).st_ino)
+        shard.index, shard.offset = index, offset
+
+    def _records(self) -> Iterator[Tuple[str, ConversationRecord]]:
+        """Every stored record, shard by shard"""
+        for shard in self.shards:
+            with self._locked(shard):
+                items = list(self._replay(shard).items())
+            yield from items
+
+    def count(self) -> int:
+        total = 0
+        for shard in self.shards:
+            with self._locked(shard):
+                total += len(shard.index)
+        return total
@@ -1,53 +1,250 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
 import json
-from datetime import datetime
+import hashlib
+from datetime import datetime, timedelta
 import os
+import threading
+import time
 from pathlib import Path
 
+from memory.blobs import BlobStore
+from memory.records import BLOB_KEY, REF_KEY, ConversationRecord
+
 class MemoryStore:
-    def __init__(self, storage_path: str = "memory_store.json"):
+    """JSON-file backed store of conversations and their agent history.
+
+    Sub-documents of agent output that serialize to at least ref_threshold
+    bytes are stored once per conversation under "documents" and replaced in
+    the history by {"$doc": <id>}, so an extraction that is echoed back in
+    action payloads is only persisted once. get_conversation() resolves the
+    references unless asked not to.
+
+    With a blob_store, the raw upload and any string of at least
+    blob_threshold bytes (email bodies, extracted text) are kept in the
+    content-addressed blob store and only their hashes are recorded; each
+    conversation holds one reference per distinct blob in "blobs".
+
+    In memory each conversation is a compact ConversationRecord; the dict
+    shape above, with ISO timestamps, is produced only when a conversation
+    is read out or the store is saved.
+    """
+
+    def __init__(
+        self,
+        storage_path: str = "memory_store.json",
+        ref_threshold: int = 256,
+        blob_store: Optional[BlobStore] = None,
+        blob_threshold: int = 4096
+    ):
         self.storage_path = storage_path
-        self._store = self._load_store()
+        self.ref_threshold = ref_threshold
+        self.blob_store = blob_store
+        self.blob_threshold = blob_threshold
+        self._loaded_store = None
+        # Guards the in-memory map and the file against concurrent pipelines
+        self._lock = threading.RLock()
+
+    @property
+    def _store(self) -> Dict[str, ConversationRecord]:
+        """Conversation map, loaded from disk on first access"""
+        if self._loaded_store is None:
+            with self._lock:
+                if self._loaded_store is None:
+                    self._loaded_store = self._load_store()
+        return self._loaded_store
 
-    def _load_store(self) -> Dict:
+    def load(self):
+        """Load the store from disk now rather than on first access"""
+        self._store
+
+    def _load_store(self) -> Dict[str, ConversationRecord]:
         """Load the memory store from disk if it exists"""
         if os.path.exists(self.storage_path):
             with open(self.storage_path, 'r') as f:
-                return json.load(f)
+                return {
+                    conversation_id: ConversationRecord.from_dict(conv)
+                    for conversation_id, conv in json.load(f).items()
+                }
         return {}
 
     def _save_store(self):
         """Save the current memory store to disk"""
-        Path(self.storage_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(self.storage_path, 'w') as f:
-            json.dump(self._store, f, indent=2)
-
-    def add_conversation(self, conversation_id: str, metadata: Dict[str, Any]):
-        """Create a new conversation entry"""
-        self._store[conversation_id] = {
-            "metadata": metadata,
-            "history": [],
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat()
-        }
-        self._save_store()
+        with self._lock:
+            Path(self.storage_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.storage_path, 'w') as f:
+                f.write('{')
+                for index, (conversation_id, conv) in enumerate(self._store.items()):
+                    f.write(f'{"," if index else ""}\n{json.dumps(conversation_id)}:{conv.to_json()}')
+                f.write('\n}')
+
+    def add_conversation(self, conversation_id: str, metadata: Dict[str, Any], raw: Optional[bytes] = None,
+                         raw_digest: Optional[str] = None):
+        """Create a new conversation entry, keeping the raw document if a blob store is configured.
+
+        raw_digest is the SHA-256 of raw, if the caller has already computed it.
+        """
+        with self._lock:
+            conv = ConversationRecord()
+            if raw is not None and self.blob_store is not None:
+                metadata["raw_blob"] = self._put_blob(conv, raw, raw_digest)
+            conv.metadata = metadata
+            self._store[conversation_id] = conv
+            self._save_store()
+
+    def _put_blob(self, conv: ConversationRecord, data: bytes, digest: Optional[str] = None) -> str:
+        """Store data in the blob store, referencing it once from this conversation"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if conv.add_blob(digest):
+            self.blob_store.add(data, digest)
+        return digest
+
+    def get_raw(self, conversation_id: str) -> Optional[bytes]:
+        """Return the raw uploaded document, if it was kept"""
+        conv = self._get(conversation_id)
+        digest = conv.metadata.get("raw_blob") if conv is not None else None
+        if not digest or self.blob_store is None:
+            return None
+        return self.blob_store.get(digest)
+
+    def add_artifact(self, conversation_id: str, name: str, data: bytes) -> Optional[str]:
+        """Keep a file produced while processing a conversation, such as a profile.
+
+        Returns the blob hash, or None if no blob store is configured.
+        """
+        if self.blob_store is None:
+            return None
+        with self._lock:
+            if conversation_id not in self._store:
+                raise KeyError(f"Conversation {conversation_id} not found")
+            conv = self._store[conversation_id]
+            digest = self._put_blob(conv, data)
+            if conv.artifacts is None:
+                conv.artifacts = {}
+            conv.artifacts[name] = digest
+            self._save_store()
+            return digest
+
+    def get_artifact(self, conversation_id: str, name: str) -> Optional[bytes]:
+        """Return an artifact stored with add_artifact(), if present"""
+        conv = self._get(conversation_id)
+        digest = (conv.artifacts or {}).get(name) if conv is not None else None
+        if not digest or self.blob_store is None:
+            return None
+        return self.blob_store.get(digest)
+
+    def expire(self, max_age: timedelta) -> int:
+        """Drop conversations not updated within max_age and garbage-collect their blobs.
+
+        Returns the number of conversations removed.
+        """
+        with self._lock:
+            cutoff = (datetime.now() - max_age).timestamp()
+            expired = [cid for cid, conv in self._store.items() if conv.last_updated < cutoff]
+            released = []
+            for conversation_id in expired:
+                released.extend(self._store.pop(conversation_id).blobs or [])
+            if expired:
+                self._save_store()
+            if released and self.blob_store is not None:
+                self.blob_store.release(released)
+                self.blob_store.collect()
+            return len(expired)
 
     def update_conversation(self, conversation_id: str, agent_output: Dict[str, Any]):
         """Add new agent output to conversation history"""
-        if conversation_id not in self._store:
-            raise KeyError(f"Conversation {conversation_id} not found")
+        self.update_conversations([(conversation_id, agent_output)])
+
+    def update_conversations(self, updates: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Add agent output to several conversations, saving the store once"""
+        with self._lock:
+            for conversation_id, agent_output in updates:
+                if conversation_id not in self._store:
+                    raise KeyError(f"Conversation {conversation_id} not found")
+            
+                conv = self._store[conversation_id]
+                conv.append({key: self._intern(value, conv) for key, value in agent_output.items()}, time.time())
+            self._save_store()
+
+    def _intern(self, value: Any, conv: ConversationRecord) -> Any:
+        """Replace large sub-documents with references into the conversation's documents, bottom-up"""
+        if isinstance(value, dict):
+            value = {key: self._intern(item, conv) for key, item in value.items()}
+        elif isinstance(value, list):
+            value = [self._intern(item, conv) for item in value]
+        elif (isinstance(value, str) and self.blob_store is not None
+              and len(value) >= self.blob_threshold):
+            return {BLOB_KEY: self._put_blob(conv, value.encode('utf-8'))}
+        else:
+            return value
         
-        self._store[conversation_id]["history"].append({
-            "timestamp": datetime.now().isoformat(),
-            "agent_output": agent_output
-        })
-        self._store[conversation_id]["last_updated"] = datetime.now().isoformat()
-        self._save_store()
-
-    def get_conversation(self, conversation_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a conversation by ID"""
+        encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+        if len(encoded) < self.ref_threshold:
+            return value
+        doc_id = hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+        conv.add_document(doc_id, value)
+        return {REF_KEY: doc_id}
+
+    def _resolve(self, value: Any, documents: Dict[str, str], blobs: Iterable[str] = ()) -> Any:
+        """Expand references produced by _intern; documents holds them encoded.
+
+        Only blobs the conversation recorded are expanded: agent output can
+        carry uploaded data shaped like a reference, which is left as is.
+        """
+        if isinstance(value, dict):
+            if len(value) == 1 and REF_KEY in value and value[REF_KEY] in documents:
+                return self._resolve(json.loads(documents[value[REF_KEY]]), documents, blobs)
+            if (len(value) == 1 and BLOB_KEY in value and self.blob_store is not None
+                    and isinstance(value[BLOB_KEY], str) and value[BLOB_KEY] in blobs):
+                return self.blob_store.get(value[BLOB_KEY]).decode('utf-8')
+            return {key: self._resolve(item, documents, blobs) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._resolve(item, documents, blobs) for item in value]
+        return value
+
+    def get_conversation(self, conversation_id: str, resolve: bool = True) -> Optional[Dict[str, Any]]:
+        """Retrieve a conversation by ID.
+
+        With resolve=False the stored form is returned as is, with shared
+        sub-documents left as references into its "documents" map.
+        """
+        conv = self._get(conversation_id)
+        if conv is None:
+            return None
+        return self._resolved(conv) if resolve else conv.to_dict()
+
+    def _resolved(self, conv: ConversationRecord) -> Dict[str, Any]:
+        if not (conv.documents or conv.blobs):
+            return conv.to_dict(references=False)
+        return conv.to_dict(
+            history=self._resolve(conv.history, conv.documents or {}, frozenset(conv.blobs or ())),
+            references=False
+        )
+
+    def _get(self, conversation_id: str) -> Optional[ConversationRecord]:
+        """The stored record of a conversation"""
         return self._store.get(conversation_id)
 
+    def iter_conversations(self, resolve: bool = True) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (conversation_id, conversation) for every stored conversation, decoding one at a time"""
+        for conversation_id, conv in self._records():
+            yield conversation_id, self._resolved(conv) if resolve else conv.to_dict()
+
+    def _records(self) -> Iterator[Tuple[str, ConversationRecord]]:
+        with self._lock:
+            items = list(self._store.items())
+        return iter(items)
+
+    def iter_summaries(self) -> Iterator[Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]]:
+        """Yield (conversation_id, format, intent, action types) of every conversation's latest results.
+
+        Reads only the records' hot fields, without decoding any history.
+        """
+        for conversation_id, conv in self._records():
+            yield conversation_id, conv.format, conv.intent, conv.action_types
+
+    def count(self) -> int:
+        return len(self._store)
+
     def get_latest_agent_output(self, conversation_id: str) -> Optional[Dict[str, Any]]:
         """Get the most recent agent output for a conversation"""
         conv = self.get_conversation(conversation_id)
@@ -6,6 +6,114 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultsDiv = document.getElementById('results');
     const resultContent = document.getElementById('resultContent');
 
+    const stageLabels = {
+        received: 'Upload received',
+        classified: 'Document classified',
+        page_extracted: 'Extracting pages',
+        extracted: 'Content extracted',
+        actions_routed: 'Actions routed',
+        stored: 'Results stored'
+    };
+
+    function resetLoadingState() {
+        submitBtn.disabled = false;
+        btnText.classList.remove('hidden');
+        loadingSpinner.classList.add('hidden');
+    }
+
+    function renderClassification(classification) {
+        return `
+            <div class='mb-4'>
+                <h4 class='text-xl font-bold text-purple-300'>Classification</h4>
+                <p>Format: ${classification.format}</p>
+                <p>Intent: ${classification.intent}</p>
+                <p>Confidence: ${Math.round(classification.confidence * 100)}%</p>
+            </div>
+        `;
+    }
+
+    function renderProgress(stage, data, classification) {
+        let label = stageLabels[stage] || stage;
+        if (stage === 'page_extracted') {
+            label = `${label} (${data.page}/${data.pages})`;
+        }
+        resultContent.innerHTML = `
+            <div class='text-white'>
+                <p class='mb-4 text-purple-200'>${label}&hellip;</p>
+                ${classification ? renderClassification(classification) : ''}
+            </div>
+        `;
+    }
+
+    function renderResult(data) {
+        if (data.success) {
+            resultContent.innerHTML = `
+                <div class='text-white'>
+                    ${renderClassification(data.classification)}
+
+                    <div class='mb-4'>
+                        <h4 class='text-xl font-bold text-purple-300'>Extracted Data</h4>
+                        <pre class='bg-gray-800 p-4 rounded-lg overflow-auto'>${JSON.stringify(data.result, null, 2)}</pre>
+                    </div>
+
+                    ${data.actions ? `
+                        <div class='mb-4'>
+                            <h4 class='text-xl font-bold text-purple-300'>Actions Taken</h4>
+                            <ul class='list-disc list-inside'>
+                                ${data.actions.actions.map(action => `
+                                    <li>${action.service}: ${action.action} - ${action.status}</li>
+                                `).join('')}
+                            </ul>
+                        </div>
+                    ` : ''}
+                </div>
+            `;
+        } else {
+            renderError(data.error || 'An unknown error occurred');
+        }
+    }
+
+    function renderError(message) {
+        resultContent.innerHTML = `
+            <div class='text-red-500'>
+                <h4 class='text-xl font-bold'>Error</h4>
+                <p>${message}</p>
+            </div>
+        `;
+    }
+
+    // Follow stage events for a submitted document until it completes
+    function followProgress(eventsUrl) {
+        const source = new EventSource(eventsUrl);
+        let classification = null;
+
+        Object.keys(stageLabels).forEach(stage => {
+            source.addEventListener(stage, (e) => {
+                const event = JSON.parse(e.data);
+                if (stage === 'classified') {
+                    classification = event.data.classification;
+                }
+                renderProgress(stage, event.data, classification);
+            });
+        });
+
+        const finish = (e) => {
+            source.close();
+            renderResult(JSON.parse(e.data).data);
+            resetLoadingState();
+        };
+        source.addEventListener('completed', finish);
+        source.addEventListener('failed', finish);
+
+        source.onerror = () => {
+            // The stream closed before a terminal event
+            if (source.readyState === EventSource.CLOSED) {
+                renderError('Lost connection to the progress stream');
+                resetLoadingState();
+            }
+        };
+    }
+
     form.addEventListener('submit', async (e) => {
         e.preventDefault();
         console.log('Form submitted');
@@ -14,13 +122,14 @@ document.addEventListener('DOMContentLoaded', function() {
         submitBtn.disabled = true;
         btnText.classList.add('hidden');
         loadingSpinner.classList.remove('hidden');
-        resultsDiv.classList.add('hidden');
+        resultsDiv.classList.remove('hidden');
+        renderProgress('received', {}, null);
 
         try {
             const formData = new FormData(form);
-            console.log('Sending request to /upload');
+            console.log('Sending request to /upload/async');
 
-            const response = await fetch('/upload', {
+            const response = await fetch('/upload/async', {
                 method: 'POST',
                 body: formData
             });
@@ -30,54 +139,15 @@ document.addEventListener('DOMContentLoaded', function() {
             console.log('Response data:', data);
 
             if (data.success) {
-                resultContent.innerHTML = `
-                    <div class='text-white'>
-                        <div class='mb-4'>
-                            <h4 class='text-xl font-bold text-purple-300'>Classification</h4>
-                            <p>Format: ${data.classification.format}</p>
-                            <p>Intent: ${data.classification.intent}</p>
-                            <p>Confidence: ${Math.round(data.classification.confidence * 100)}%</p>
-                        </div>
-                        
-                        <div class='mb-4'>
-                            <h4 class='text-xl font-bold text-purple-300'>Extracted Data</h4>
-                            <pre class='bg-gray-800 p-4 rounded-lg overflow-auto'>${JSON.stringify(data.result, null, 2)}</pre>
-                        </div>
-                        
-                        ${data.actions ? `
-                            <div class='mb-4'>
-                                <h4 class='text-xl font-bold text-purple-300'>Actions Taken</h4>
-                                <ul class='list-disc list-inside'>
-                                    ${data.actions.actions.map(action => `
-                                        <li>${action.service}: ${action.action} - ${action.status}</li>
-                                    `).join('')}
-                                </ul>
-                            </div>
-                        ` : ''}
-                    </div>
-                `;
+                followProgress(data.events);
             } else {
-                resultContent.innerHTML = `
-                    <div class='text-red-500'>
-                        <h4 class='text-xl font-bold'>Error</h4>
-                        <p>${data.error || 'An unknown error occurred'}</p>
-                    </div>
-                `;
+                renderError(data.error || data.detail || 'An unknown error occurred');
+                resetLoadingState();
             }
         } catch (error) {
             console.error('Error:', error);
-            resultContent.innerHTML = `
-                <div class="text-red-500">
-                    <h3 class="text-xl font-bold">Error</h3>
-                    <p>${error.message}</p>
-                </div>
-            `;
-        } finally {
-            // Reset loading state
-            submitBtn.disabled = false;
-            btnText.classList.remove('hidden');
-            loadingSpinner.classList.add('hidden');
-            resultsDiv.classList.remove('hidden');
+            renderError(error.message);
+            resetLoadingState();
         }
     });
 });
@@ -0,0 +1,77 @@
+"""Tests for admission control of uploads and email attachments.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import threading
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp.admission import AdmissionController, AdmissionRejected
+from mcp.pipeline import DocumentPipeline
+
+
+def make_email(attachments: int) -> bytes:
+    message = MIMEMultipart()
+    message["From"] = "buyer@example.com"
+    message["Subject"] = "Invoices attached"
+    message.attach(MIMEText("Please find the invoices attached."))
+    for i in range(attachments):
+        invoice = json.dumps({"invoice_number": f"INV-{i}", "amount": 10 * i}).encode()
+        message.attach(MIMEApplication(invoice, "json", Name=f"invoice-{i}.json"))
+    return message.as_bytes()
+
+
+def test_attachments_wait_for_admission():
+    admission = AdmissionController({"json": 1})
+    pipeline = DocumentPipeline(admission=admission, attachment_workers=4)
+    active, peak = [], []
+    lane = admission.lanes["json"]
+
+    process = pipeline.process
+    def record_peak(*args, **kwargs):
+        active.append(lane.active)
+        peak.append(max(active))
+        return process(*args, **kwargs)
+    pipeline.process = record_peak
+
+    summaries = pipeline.process_attachments(make_email(6), "parent")
+    assert [summary["success"] for summary in summaries] == [True] * 6
+    # The attachments ran in four workers but one json slot
+    assert max(peak) == 1
+    assert admission.bytes_in_flight == 0 and lane.active == 0
+
+
+def test_rejected_attachment_is_reported():
+    admission = AdmissionController({"json": 1}, byte_budget=1024)
+    pipeline = DocumentPipeline(admission=admission)
+    # Another document holds most of the budget
+    ticket = admission.admit("pdf", 1000)
+
+    summaries = pipeline.process_attachments(make_email(2), "parent")
+    assert [summary["error"] for summary in summaries] == ["In-flight byte budget exhausted"] * 2
+    ticket.release()
+    assert admission.bytes_in_flight == 0
+
+
+def test_wait_blocking_is_granted_on_release():
+    admission = AdmissionController({"pdf": 1}, queue_timeout=0.2)
+    held = admission.admit("pdf", 10)
+    queued = admission.admit("pdf", 10)
+    with pytest.raises(AdmissionRejected):
+        queued.wait_blocking()
+    assert admission.bytes_in_flight == 10
+
+    queued = admission.admit("pdf", 10)
+    threading.Timer(0.05, held.release).start()
+    queued.wait_blocking(timeout=5)
+    assert queued.granted
+    queued.release()
+    assert admission.bytes_in_flight == 0
@@ -0,0 +1,142 @@
+"""Tests for the HTTP API, run against a store and blob store in a temporary directory.
+
+    python -m pytest tests
+"""
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """mcp.api configured from MAS_* variables pointing into a temporary directory"""
+    tmp = tmp_path_factory.mktemp("api")
+    env = {
+        "MAS_BLOB_DIR": str(tmp / "blobs"),
+        "MAS_MEMORY_SHARDS": "4",
+        "MAS_MEMORY_DIR": str(tmp / "shards"),
+        "MAS_TEXT_CACHE_DIR": "",
+        "MAS_AGENT_POOLS": "0",
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    cwd = os.getcwd()
+    # Templates and static files are found relative to the working directory
+    os.chdir(ROOT)
+    try:
+        import mcp.api
+        yield importlib.reload(mcp.api)
+    finally:
+        os.chdir(cwd)
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+    return TestClient(api.app)
+
+
+def upload_json(client, document):
+    response = client.post("/upload", files={"file": ("invoice.json", json.dumps(document).encode(), "application/json")})
+    assert response.status_code == 200, response.text
+    return response.json()["conversation_id"]
+
+
+def stored_line_items(client, conversation_id):
+    response = client.get(f"/status/{conversation_id}")
+    assert response.status_code == 200, response.text
+    for entry in response.json()["history"]:
+        extraction = entry["agent_output"].get("extraction")
+        if extraction:
+            return extraction["data"]["content"]["line_items"]
+
+
+def test_uploaded_blob_references_are_not_resolved(client):
+    # An absolute path is not a digest and never reaches the file system
+    conversation_id = upload_json(client, {
+        "invoice_number": "INV-1", "amount": 10, "items": [{"$blob": "/etc/hostname"}]
+    })
+    assert stored_line_items(client, conversation_id) == [{"$blob": "/etc/hostname"}]
+
+    # Nor is a real blob that belongs to another conversation
+    other = client.get(f"/status/{conversation_id}").json()["metadata"]["raw_blob"]
+    conversation_id = upload_json(client, {
+        "invoice_number": "INV-2", "amount": 10, "items": [{"$blob": other}]
+    })
+    assert stored_line_items(client, conversation_id) == [{"$blob": other}]
+
+
+def test_pdf_pages_come_from_the_agent(client, api, monkeypatch):
+    import io
+    import PyPDF2
+
+    writer = PyPDF2.PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+
+    # The classifier sniffs the header; only the PDF agent parses the document
+    classify = api.pipeline.classifier.classify
+    def classify_without_pypdf2(*args, **kwargs):
+        with monkeypatch.context() as patch:
+            patch.setattr(PyPDF2, "PdfReader", None)
+            return classify(*args, **kwargs)
+    monkeypatch.setattr(api.pipeline.classifier, "classify", classify_without_pypdf2)
+
+    response = client.post("/upload", files={"file": ("blank.pdf", pdf.getvalue(), "application/pdf")})
+    assert response.status_code == 200, response.text
+    classification = response.json()["classification"]
+    assert classification["format"] == "pdf"
+    assert classification["metadata"]["format_details"]["pages"] == 3
+
+
+def test_async_upload_releases_its_ticket(client, api):
+    response = client.post("/upload/async", files={"file": ("invoice.json", b'{"invoice_number": "INV-3"}', "application/json")})
+    assert response.status_code == 202, response.text
+    # The test client returns after background tasks have run
+    assert client.get(f"/status/{response.json()['conversation_id']}").status_code == 200
+    assert api.admission.bytes_in_flight == 0
+
+
+def test_async_upload_releases_its_ticket_when_the_response_is_lost(api):
+    import asyncio
+    import requests
+
+    upload = requests.Request(
+        "POST", "http://testserver/upload/async",
+        files={"file": ("invoice.json", b'{"invoice_number": "INV-4"}', "application/json")}
+    ).prepare()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "server": ("testserver", 80), "client": ("testclient", 50000),
+        "path": "/upload/async", "raw_path": b"/upload/async", "root_path": "", "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in upload.headers.items()],
+    }
+    messages = [{"type": "http.request", "body": upload.body, "more_body": False}]
+    admitted = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client went away before the 202 reached it
+        if message["type"] == "http.response.start":
+            admitted.append(api.admission.bytes_in_flight)
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        asyncio.run(api.app(scope, receive, send))
+    assert admitted[0] > 0
+    assert api.admission.bytes_in_flight == 0
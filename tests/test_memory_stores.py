@@ -0,0 +1,231 @@
+"""Tests for the conversation stores, the blob store and ConversationRecord.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.blobs import BlobStore
+from memory.records import ConversationRecord
+from memory.sharded import ShardedMemoryStore
+from memory.store import MemoryStore
+
+CONVERSATION_ID = "0a1b2c3d-0000-4000-8000-000000000000"
+
+
+def classification(intent: str):
+    return {"classification": {"format": "email", "intent": intent}, "rules_version": 1}
+
+
+def intents(store, conversation_id: str = CONVERSATION_ID):
+    history = store.get_conversation(conversation_id)["history"]
+    return [entry["agent_output"]["classification"]["intent"] for entry in history]
+
+
+def append_intents(root: str, prefix: str, count: int):
+    """Append count history entries from a separate process"""
+    store = ShardedMemoryStore(root, shards=4)
+    for i in range(count):
+        store.update_conversation(CONVERSATION_ID, classification(f"{prefix}{i}"))
+
+
+def test_sharded_store_replays_other_writers(tmp_path):
+    writer = ShardedMemoryStore(str(tmp_path), shards=4)
+    reader = ShardedMemoryStore(str(tmp_path), shards=4)
+    writer.add_conversation(CONVERSATION_ID, {"filename": "a.eml"})
+    assert reader.get_conversation(CONVERSATION_ID)["metadata"]["filename"] == "a.eml"
+
+    writer.update_conversation(CONVERSATION_ID, classification("rfq"))
+    reader.update_conversation(CONVERSATION_ID, classification("complaint"))
+    assert intents(writer) == intents(reader) == ["rfq", "complaint"]
+    assert writer.count() == reader.count() == 1
+
+
+def test_sharded_store_writes_without_replaying(tmp_path):
+    writer = ShardedMemoryStore(str(tmp_path), shards=1)
+    other = ShardedMemoryStore(str(tmp_path), shards=1)
+    writer.add_conversation(CONVERSATION_ID, {"filename": "a.eml"})
+    for i in range(20):
+        conversation_id = f"{i:08x}-0000-4000-8000-000000000000"
+        other.add_conversation(conversation_id, {"filename": f"{i}.eml"})
+        other.update_conversation(conversation_id, classification("rfq"))
+    writer.update_conversation(CONVERSATION_ID, classification("invoice"))
+
+    # The other writer's lines were indexed, not decoded
+    shard = writer.shards[0]
+    assert (shard.conversations, shard.replayed) == ({}, 0)
+    assert list(shard.recent) == [CONVERSATION_ID]
+    assert intents(writer) == ["invoice"]
+    assert writer.count() == 21
+
+    # Bulk reads replay the log and agree with per-conversation reads
+    replayed = dict(writer.iter_conversations(resolve=False))
+    assert len(replayed) == 21
+    assert all(replayed[cid] == other.get_conversation(cid, resolve=False) for cid in replayed)
+
+
+def test_sharded_store_ids_with_escapes(tmp_path):
+    store = ShardedMemoryStore(str(tmp_path), shards=2)
+    for conversation_id in ('quote"id', "back\\slash", "caf\u00e9"):
+        store.add_conversation(conversation_id, {"filename": "a.eml"})
+        store.update_conversation(conversation_id, classification("rfq"))
+        assert intents(ShardedMemoryStore(str(tmp_path), shards=2), conversation_id) == ["rfq"]
+    assert ShardedMemoryStore(str(tmp_path), shards=2).count() == 3
+
+
+def test_sharded_store_across_processes(tmp_path):
+    store = ShardedMemoryStore(str(tmp_path), shards=4)
+    store.add_conversation(CONVERSATION_ID, {"filename": "a.eml"})
+
+    child = get_context("spawn").Process(target=append_intents, args=(str(tmp_path), "child-", 50))
+    child.start()
+    append_intents(str(tmp_path), "parent-", 50)
+    child.join(timeout=60)
+    assert child.exitcode == 0
+
+    stored = intents(store)
+    assert len(stored) == 100
+    assert [intent for intent in stored if intent.startswith("child-")] == [f"child-{i}" for i in range(50)]
+    assert [intent for intent in stored if intent.startswith("parent-")] == [f"parent-{i}" for i in range(50)]
+
+
+def test_sharded_store_skips_torn_line(tmp_path):
+    store = ShardedMemoryStore(str(tmp_path), shards=1)
+    store.add_conversation(CONVERSATION_ID, {"filename": "a.eml"})
+    # A writer crashed halfway through a record
+    with open(store.shards[0].log_path, 'ab') as f:
+        f.write(b'{"op":"update","id":')
+
+    survivor = ShardedMemoryStore(str(tmp_path), shards=1)
+    survivor.update_conversation(CONVERSATION_ID, classification("invoice"))
+    assert intents(survivor) == ["invoice"]
+    assert intents(ShardedMemoryStore(str(tmp_path), shards=1)) == ["invoice"]
+
+
+def test_sharded_store_compaction_replaces_log(tmp_path):
+    writer = ShardedMemoryStore(str(tmp_path), shards=1)
+    reader = ShardedMemoryStore(str(tmp_path), shards=1)
+    writer.add_conversation(CONVERSATION_ID, {"filename": "a.eml"})
+    for intent in ("rfq", "complaint", "invoice"):
+        writer.update_conversation(CONVERSATION_ID, classification(intent))
+    assert intents(reader) == ["rfq", "complaint", "invoice"]
+
+    log_path = writer.shards[0].log_path
+    inode = os.stat(log_path).st_ino
+    writer.compact()
+    assert os.stat(log_path).st_ino != inode
+    assert len(log_path.read_bytes().splitlines()) == 1
+
+    # The reader notices the new log instead of reading on from its old offset
+    writer.update_conversation(CONVERSATION_ID, classification("regulation"))
+    assert intents(reader) == ["rfq", "complaint", "invoice", "regulation"]
+
+
+def test_expire_releases_blobs(tmp_path):
+    for store in (
+        MemoryStore(str(tmp_path / "memory_store.json"), blob_store=BlobStore(str(tmp_path / "blobs"))),
+        ShardedMemoryStore(str(tmp_path / "shards"), shards=4, blob_store=BlobStore(str(tmp_path / "shard_blobs")))
+    ):
+        store.add_conversation(CONVERSATION_ID, {"filename": "a.eml"}, raw=b"raw email")
+        digest = store.get_conversation(CONVERSATION_ID)["metadata"]["raw_blob"]
+        assert store.get_raw(CONVERSATION_ID) == b"raw email"
+
+        assert store.expire(timedelta(days=1)) == 0
+        assert store.blob_store.exists(digest)
+
+        time.sleep(0.01)
+        assert store.expire(timedelta(0)) == 1
+        assert store.get_conversation(CONVERSATION_ID) is None
+        assert not store.blob_store.exists(digest)
+        assert digest not in store.blob_store.refs
+
+
+def test_blob_store_reference_counts(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    digest = blobs.put(b"shared")
+    assert blobs.put(b"shared") == digest
+    blobs.incref(digest)
+    blobs.incref(digest)
+
+    blobs.decref(digest)
+    assert blobs.collect() == 0
+    assert blobs.get(digest) == b"shared"
+
+    blobs.decref(digest)
+    assert BlobStore(str(tmp_path)).refs == {digest: 0}
+    assert blobs.collect() == 1
+    assert not blobs.exists(digest)
+    # Emptied shard directories are pruned too
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["refs.json", "refs.lock"]
+
+
+def test_blob_store_concurrent_puts_of_one_blob(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"))
+    # Large enough that writers of the same blob overlap
+    uploads = [bytes([i]) * (4 << 20) for i in range(10)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        digests = list(executor.map(blobs.put, [upload for upload in uploads for _ in range(20)]))
+    assert len(set(digests)) == len(uploads)
+    assert all(blobs.get(digest) == upload for digest, upload in zip(digests[::20], uploads))
+
+    store = ShardedMemoryStore(str(tmp_path / "shards"), shards=4, blob_store=blobs)
+    ids = [f"{i:08x}-0000-4000-8000-000000000000" for i in range(100)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda cid: store.add_conversation(cid, {}, raw=b"duplicate upload"), ids))
+    digest = store.get_conversation(ids[0])["metadata"]["raw_blob"]
+    assert blobs.refs[digest] == 100
+    assert blobs.get(digest) == b"duplicate upload"
+
+
+def test_blob_store_add_survives_collect(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    # A blob whose last reference was dropped, waiting for collection
+    digest = blobs.add(b"document")
+    blobs.decref(digest)
+
+    # collect() runs between storing the blob again and referencing it
+    put = blobs.put
+    def put_then_collect(data, digest=None):
+        blobs.put = put
+        digest = put(data, digest)
+        assert blobs.collect() == 1
+        return digest
+    blobs.put = put_then_collect
+
+    assert blobs.add(b"document") == digest
+    assert blobs.refs[digest] == 1
+    assert blobs.get(digest) == b"document"
+
+
+def test_blob_store_rejects_non_digests(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    for name in ("/etc/hostname", "../" * 30 + "etc/hostname", "AB" * 32, "ab" * 31):
+        with pytest.raises(ValueError):
+            blobs.get(name)
+
+
+def test_record_round_trip():
+    record = ConversationRecord({"filename": "a.pdf", "size": 10}, created_at=1700000000.5)
+    record.add_document("doc1", {"fields": {"total": 15000.0}})
+    record.add_blob("ab" * 32)
+    record.artifacts = {"profile.pstats": "cd" * 32}
+    record.append(classification("invoice"), 1700000001.25)
+    record.append({"extraction": {"$doc": "doc1"}, "agent": "pdf_agent"}, 1700000002.0)
+    record.append({"actions": {"success": True, "actions": [
+        {"service": "finance", "action": "high_value_review"}
+    ]}}, 1700000003.0)
+
+    copy = ConversationRecord.from_dict(json.loads(record.to_json()))
+    assert copy.to_dict() == record.to_dict()
+    assert copy.to_json() == record.to_json()
+    assert (copy.format, copy.intent, copy.action_types) == ("email", "invoice", ("finance_high_value_review",))
+    assert (copy.created_at, copy.last_updated, len(copy)) == (1700000000.5, 1700000003.0, 3)
@@ -0,0 +1,50 @@
+"""Tests that PDFAgent invoice extraction matches the implementation it replaced.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from agents.pdf_agent import PDFAgent
+from agents.text_cache import PageTextCache
+from bench_pdf_invoice import legacy_process_invoice, make_invoice_text
+
+INVOICES = [
+    "INVOICE\n30 days net. Total: 15000\n",
+    "INVOICE\nItem 1 Widget 2 10.00 20.00\nTotal: 20.00\n",
+    "Invoice 2024 payment due 12 March 2024 total 15000.00 10000\n",
+    "INVOICE\n10 Widgets 2.50 25.00 Tax: 5.00\n",
+    "Invoice Number: 100245\nDate: 2025-05-30    Due Date: 30.06.2025\n",
+    "Subtotal: 1,250.00\nTax: 0.00\nTOTAL: 1,250.00\nTotal amount: ...\n",
+    "INVOICE\n\t3  Consulting hours  1,250.00  3,750.00  \r\nno items here\n",
+    "",
+]
+
+
+@pytest.fixture
+def agent(tmp_path):
+    return PDFAgent(text_cache=PageTextCache(str(tmp_path)))
+
+
+@pytest.mark.parametrize("text", INVOICES + [make_invoice_text(3)])
+def test_invoice_matches_legacy(agent, text):
+    result = agent._process_invoice(text)
+    legacy = legacy_process_invoice(agent.invoice_fields, text)
+    assert result["extracted_fields"] == legacy["extracted_fields"]
+    assert result["line_items"] == legacy["line_items"]
+
+
+def test_invoice_keeps_total_and_rows(agent):
+    result = agent._process_invoice("Invoice 2024 payment due 12 March 2024 total 15000.00 10000\n")
+    assert result["extracted_fields"]["total"] == 15000.0
+    assert result["flags"][0]["type"] == "high_value"
+
+    result = agent._process_invoice("INVOICE\n10 Widgets 2.50 25.00 Tax: 5.00\n")
+    assert result["line_items"] == ["10 Widgets 2.50 25.00 Tax: 5.00"]
+    assert result["extracted_fields"]["tax"] == 5.0